@@ -0,0 +1,304 @@
+"""
+Reproducible throughput benchmarks for the fuzzer and the reducer.
+
+Every benchmark runs from fixed seeds over the checked-in bugs/*.sql corpus and
+without Docker: the differential oracle is either an in-process stand-in (two
+sqlite3 connections of the Python build) or two local sqlite3 binaries.
+
+    python bench/bench.py --out bench/results.json
+    python bench/bench.py --oracle local --binaries /usr/bin/sqlite3-3.26.0 /usr/bin/sqlite3-3.39.4
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The fuzzer modules import each other by bare name, the reducer through its own `src` package
+sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "reducer")]
+
+from sqlglot import parse_one
+from scripts import create_fixed_db, create_random_db
+from generator import Generator
+from grammar import GrammarGenerator
+import src.reducer as reducer
+
+SEED = 1234
+MUTANTS_PER_PARENT = 3
+
+
+def load_corpus(pattern=os.path.join(ROOT, "bugs", "*.sql")):
+    """(name, sql) of every corpus file, in a stable order."""
+    paths = sorted(glob.glob(pattern), key=lambda p: (len(p), p))
+    corpus = []
+    for path in paths:
+        with open(path) as f:
+            corpus.append((os.path.basename(path), f.read().strip()))
+    return corpus
+
+
+def rate(count, seconds):
+    return count / seconds if seconds else 0.0
+
+
+class LocalOracle:
+    """Runs a query on two executors against the same database file and compares the outputs."""
+
+    def __init__(self, db_path, binaries=None):
+        self.db_path = db_path
+        self.binaries = binaries
+        if binaries is None:
+            uri = f"file:{db_path}?mode=ro"
+            self.conns = [sqlite3.connect(uri, uri=True) for _ in range(2)]
+
+    def execute(self, side, query):
+        """(output, failed) of `query` on executor `side` (0: instrumented, 1: reference)."""
+        if self.binaries is not None:
+            result = subprocess.run([self.binaries[side], self.db_path], input=query.encode(), capture_output=True)
+            return result.stdout, bool(result.stderr) or result.returncode != 0
+        rows = self.fetch(side, query)
+        return (repr(rows), False) if isinstance(rows, list) else (rows, True)
+
+    def fetch(self, side, query):
+        """Rows of the last statement on in-process executor `side`, or the error message."""
+        try:
+            cursor = self.conns[side].cursor()
+            for statement in filter(str.strip, query.split(";")):
+                cursor.execute(statement)
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            return str(e)
+
+    def differs(self, query):
+        return self.execute(0, query) != self.execute(1, query)
+
+    def close(self):
+        if self.binaries is None:
+            for conn in self.conns:
+                conn.close()
+
+
+def bench_generator(db_json, corpus, seed):
+    parents = [sql for _, sql in corpus]
+    asts = [parse_one(sql, error_level='IGNORE') for sql in parents]
+    results = {}
+
+    gen = Generator(db_json, rng=random.Random(seed))
+    start = time.perf_counter()
+    count = sum(len(gen.mutate_query(sql, MUTANTS_PER_PARENT)) for sql in parents)
+    elapsed = time.perf_counter() - start
+    results["mutate_query"] = {"mutants": count, "seconds": elapsed, "mutants_per_sec": rate(count, elapsed)}
+
+    gen = Generator(db_json, rng=random.Random(seed))
+    start = time.perf_counter()
+    count = sum(len(gen.mutate_ast(ast, MUTANTS_PER_PARENT)) for ast in asts)
+    elapsed = time.perf_counter() - start
+    results["mutate_ast"] = {"mutants": count, "seconds": elapsed, "mutants_per_sec": rate(count, elapsed)}
+
+    grammar = GrammarGenerator(db_json, rng=random.Random(seed))
+    start = time.perf_counter()
+    count = len(grammar.generate(len(parents) * MUTANTS_PER_PARENT * 100))
+    elapsed = time.perf_counter() - start
+    results["grammar"] = {"queries": count, "seconds": elapsed, "queries_per_sec": rate(count, elapsed)}
+    return results
+
+
+def bench_setup_db(workdir, seed, shard):
+    """Local build time of the fixed and of a randomized schema (the part of setup_db before the copy)."""
+    results = {}
+    builds = [
+        ("fixed", lambda: create_fixed_db(random.Random(seed))),
+        (f"shard{shard}", lambda: create_random_db(shard)),
+    ]
+    for name, build in builds:
+        path = os.path.join(workdir, f"{name}.db")
+        start = time.perf_counter()
+        db = build()
+        generated = time.perf_counter()
+        db.to_sqlite(path)
+        end = time.perf_counter()
+        results[name] = {
+            "tables": len(db.tables),
+            "rows": sum(len(t.rows) + (len(t.data[0][0]) if t.data else 0) for t in db.tables),
+            "generate_seconds": generated - start,
+            "write_seconds": end - generated,
+            "seconds": end - start,
+        }
+    return results
+
+
+def oracle_queries(db_json, corpus, seed):
+    gen = Generator(db_json, rng=random.Random(seed))
+    queries = [sql for _, sql in corpus]
+    for sql in list(queries):
+        queries.extend(gen.mutate_query(sql, MUTANTS_PER_PARENT))
+    return queries
+
+
+def bench_execution(oracle, db_json, corpus, seed):
+    """
+    Execs/sec of the in-process executor alone. Both of its connections are the same
+    build, so comparing them could never find a difference: each query runs once.
+    """
+    queries = oracle_queries(db_json, corpus, seed)
+    errors = 0
+    start = time.perf_counter()
+    for query in queries:
+        errors += oracle.execute(0, query)[1]
+    elapsed = time.perf_counter() - start
+    return {
+        "queries": len(queries),
+        "execs": len(queries),
+        "errors": errors,
+        "seconds": elapsed,
+        "execs_per_sec": rate(len(queries), elapsed),
+    }
+
+
+def bench_oracle(oracle, db_json, corpus, seed):
+    """Execs/sec and differences of the differential oracle over two distinct local binaries."""
+    queries = oracle_queries(db_json, corpus, seed)
+    diffs = 0
+    errors = 0
+    start = time.perf_counter()
+    for query in queries:
+        first = oracle.execute(0, query)
+        second = oracle.execute(1, query)
+        errors += first[1]
+        diffs += first != second
+    elapsed = time.perf_counter() - start
+    return {
+        "queries": len(queries),
+        "execs": 2 * len(queries),
+        "errors": errors,
+        "diffs": diffs,
+        "seconds": elapsed,
+        "execs_per_sec": rate(2 * len(queries), elapsed),
+    }
+
+
+def bench_reducer(oracle, corpus, workdir):
+    """
+    Reduce every corpus file and count the oracle calls. With the in-process oracle both
+    sides are the same build, so a candidate stays interesting while it runs cleanly and
+    returns the same row count as the original query.
+    """
+    results = {}
+    run_test = reducer.run_test
+    for name, sql in corpus:
+        path = os.path.join(workdir, name)
+        with open(path, "w") as f:
+            f.write(sql)
+
+        if oracle.binaries is None:
+            expected = oracle.fetch(0, sql)
+            expected_rows = len(expected) if isinstance(expected, list) else None
+
+            def interesting(query, test_script):
+                rows = oracle.fetch(0, query)
+                return isinstance(rows, list) and len(rows) == expected_rows
+        else:
+            def interesting(query, test_script):
+                return oracle.differs(query)
+
+        calls = [0]
+
+        def counting(query, test_script):
+            calls[0] += 1
+            return interesting(query, test_script)
+
+        reducer.run_test = counting
+        try:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                reduced = reducer.reduce_query(path, None)
+            elapsed = time.perf_counter() - start
+        finally:
+            reducer.run_test = run_test
+
+        tracker = reducer.ReductionTracker(sql)
+        results[name] = {
+            "oracle_calls": calls[0],
+            "seconds": elapsed,
+            "tokens_before": tracker.initial_tokens,
+            "tokens_after": tracker.count_tokens(reduced) if reduced else tracker.initial_tokens,
+        }
+    total_calls = sum(r["oracle_calls"] for r in results.values())
+    total_seconds = sum(r["seconds"] for r in results.values())
+    return {"files": results, "oracle_calls": total_calls, "seconds": total_seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generator, database setup, oracle and reducer throughput")
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--shard', type=int, default=0, help="Randomized schema shard to build")
+    parser.add_argument('--corpus', default=os.path.join(ROOT, "bugs", "*.sql"))
+    parser.add_argument('--oracle', choices=["inprocess", "local"], default="inprocess")
+    parser.add_argument('--binaries', nargs=2, metavar=("INSTRUMENTED", "REFERENCE"),
+                        help="sqlite3 binaries of the local oracle")
+    parser.add_argument('--only', nargs='+', choices=["generator", "setup_db", "oracle", "reducer"])
+    parser.add_argument('--out', default=os.path.join(ROOT, "bench", "results.json"))
+    args = parser.parse_args()
+    if args.oracle == "local" and not args.binaries:
+        parser.error("--oracle local requires --binaries")
+    if args.binaries and os.path.realpath(args.binaries[0]) == os.path.realpath(args.binaries[1]):
+        parser.error("--binaries must be two distinct sqlite3 builds, or the oracle can never differ")
+
+    selected = set(args.only or ["generator", "setup_db", "oracle", "reducer"])
+    corpus = load_corpus(args.corpus)
+    report = {
+        "seed": args.seed,
+        "oracle": args.oracle,
+        "corpus": len(corpus),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "timestamp": time.time(),
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db = create_fixed_db(random.Random(args.seed))
+        db_json = db.to_json()
+        db_path = os.path.join(workdir, "test.db")
+        db.to_sqlite(db_path)
+        oracle = LocalOracle(db_path, args.binaries if args.oracle == "local" else None)
+
+        if "generator" in selected:
+            report["generator"] = bench_generator(db_json, corpus, args.seed)
+        if "setup_db" in selected:
+            report["setup_db"] = bench_setup_db(workdir, args.seed, args.shard)
+        if "oracle" in selected and args.oracle == "local":
+            report["oracle_diff"] = bench_oracle(oracle, db_json, corpus, args.seed)
+        elif "oracle" in selected:
+            report["execution"] = bench_execution(oracle, db_json, corpus, args.seed)
+        if "reducer" in selected:
+            report["reducer"] = bench_reducer(oracle, corpus, workdir)
+        oracle.close()
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    def fmt(values):
+        return ", ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in values.items())
+
+    for section in ("generator", "setup_db"):
+        for name, values in report.get(section, {}).items():
+            print(f"{section}.{name}: {fmt(values)}")
+    for section in ("execution", "oracle_diff"):
+        if section in report:
+            print(f"{section}: {fmt(report[section])}")
+    if "reducer" in report:
+        print(f"reducer: {report['reducer']['oracle_calls']} oracle calls in {report['reducer']['seconds']:.2f}s over {len(corpus)} files")
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
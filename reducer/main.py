@@ -6,12 +6,14 @@ def main():
     parser.add_argument('--query', required=True)
     parser.add_argument('--test', required=True)
     parser.add_argument('--dry-run', action='store_true', help="Skip test script and apply all reductions")
+    parser.add_argument('--db', help="Database the query was found on; its rows are reduced into a self-contained prelude")
     args = parser.parse_args()
 
     reduce_query(
         query_path=args.query,
         test_script=args.test,
-        dry_run=args.dry_run
+        dry_run=args.dry_run,
+        db_path=args.db
     )
 
 if __name__ == "__main__":
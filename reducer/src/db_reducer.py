@@ -0,0 +1,152 @@
+import math
+import sqlite3
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.scripts import run_test
+
+
+class TableDump:
+    """Schema and rows of one table of the fixture database, rows in rowid (or primary key) order."""
+
+    def __init__(self, name: str, create_sql: str, columns: List[str], rows: List[tuple], has_rowid: bool):
+        self.name = name
+        self.create_sql = create_sql
+        self.columns = columns
+        self.rows = rows
+        self.has_rowid = has_rowid
+        # Indexes and triggers on this table, created after its rows are inserted
+        self.dependents: List[str] = []
+
+
+def sql_literal(value) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bytes):
+        return f"X'{value.hex()}'"
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NULL"
+        if math.isinf(value):
+            return "9e999" if value > 0 else "-9e999"
+        return repr(value)
+    if isinstance(value, int):
+        return str(value)
+    return "'" + value.replace("'", "''") + "'"
+
+
+def dump_database(db_path: str) -> Tuple[List[TableDump], List[str]]:
+    """Tables (with their rows, indexes and triggers) and views of the database at `db_path`."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.text_factory = lambda b: b.decode(errors="replace")
+    try:
+        tables: Dict[str, TableDump] = {}
+        views: List[str] = []
+        objects = conn.execute(
+            "SELECT type, name, tbl_name, sql FROM sqlite_master "
+            "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+        ).fetchall()
+        for kind, name, tbl_name, sql in objects:
+            if kind == "table":
+                # Generated columns (hidden 2 and 3) are computed, not inserted
+                columns = [row[1] for row in conn.execute(f'PRAGMA table_xinfo("{name}")') if row[6] == 0]
+                column_list = ", ".join(f'"{c}"' for c in columns)
+                try:
+                    rows = conn.execute(f'SELECT rowid, {column_list} FROM "{name}" ORDER BY rowid').fetchall()
+                    has_rowid = True
+                except sqlite3.OperationalError:
+                    # WITHOUT ROWID tables are scanned in primary key order
+                    rows = conn.execute(f'SELECT {column_list} FROM "{name}"').fetchall()
+                    has_rowid = False
+                tables[name] = TableDump(name, sql, columns, rows, has_rowid)
+            elif kind == "view":
+                views.append(sql)
+            elif tbl_name in tables:
+                tables[tbl_name].dependents.append(sql)
+        return list(tables.values()), views
+    finally:
+        conn.close()
+
+
+def insert_sql(table: TableDump, row: tuple) -> str:
+    columns = (["rowid"] if table.has_rowid else []) + [f'"{c}"' for c in table.columns]
+    values = ", ".join(sql_literal(v) for v in row)
+    return f'INSERT INTO "{table.name}" ({", ".join(columns)}) VALUES ({values});'
+
+
+def build_prelude(tables: List[TableDump], views: List[str], kept: Dict[str, List[tuple]]) -> str:
+    """CREATE and INSERT statements of the tables in `kept`, with their kept rows, then the views."""
+    statements = []
+    for table in tables:
+        if table.name not in kept:
+            continue
+        statements.append(table.create_sql + ";")
+        statements.extend(insert_sql(table, row) for row in kept[table.name])
+        statements.extend(sql + ";" for sql in table.dependents)
+    statements.extend(sql + ";" for sql in views)
+    return "\n".join(statements)
+
+
+def ddmin(items: list, interesting: Callable[[list], bool]) -> list:
+    """
+    Delta debugging over contiguous chunks: remove ranges of `items` while the
+    remainder stays interesting, halving the chunk size when no range can go.
+    """
+    if items and interesting([]):
+        return []
+    n = 2
+    while len(items) >= 2:
+        size = math.ceil(len(items) / n)
+        for start in range(0, len(items), size):
+            complement = items[:start] + items[start + size:]
+            if interesting(complement):
+                items = complement
+                n = max(n - 1, 2)
+                break
+        else:
+            if n >= len(items):
+                break
+            n = min(len(items), 2 * n)
+    return items
+
+
+def reduce_database(db_path: str, query: str, test_script: str, dry_run: bool = False) -> Optional[str]:
+    """
+    Shrink the fixture database `query` runs against to the rows the failure needs.
+
+    Tables are dropped first, then the rows of every remaining table are bisected by
+    rowid ranges, each candidate being replayed as a CREATE+INSERT prelude followed by
+    `query` on an empty database. Returns the minimal prelude, or None when the full
+    prelude does not reproduce the failure. With `dry_run` the full prelude is returned.
+    """
+    tables, views = dump_database(db_path)
+    kept = {table.name: table.rows for table in tables}
+    total_rows = sum(len(rows) for rows in kept.values())
+    print(f"[INFO] Reducing database {db_path}: {len(tables)} tables, {total_rows} rows")
+    if dry_run:
+        return build_prelude(tables, views, kept)
+
+    calls = [0]
+
+    def interesting(candidate: Dict[str, List[tuple]]) -> bool:
+        calls[0] += 1
+        return run_test(build_prelude(tables, views, candidate) + "\n" + query, test_script)
+
+    if not interesting(kept):
+        print("[WARNING] Query does not reproduce on the dumped database, skipping database reduction")
+        return None
+
+    names = ddmin([table.name for table in tables], lambda subset: interesting({n: kept[n] for n in subset}))
+    kept = {name: kept[name] for name in names}
+    print(f"[INFO] Kept {len(kept)}/{len(tables)} tables")
+
+    for name in list(kept):
+        before = len(kept[name])
+
+        def with_rows(rows, name=name):
+            return interesting({**kept, name: rows})
+
+        kept[name] = ddmin(kept[name], with_rows)
+        print(f"[INFO] Table {name}: {before} -> {len(kept[name])} rows")
+
+    print(f"[SUCCESS] Database reduced to {sum(len(rows) for rows in kept.values())} rows in {calls[0]} oracle calls")
+    return build_prelude(tables, views, kept)
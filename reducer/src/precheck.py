@@ -0,0 +1,47 @@
+import sqlite3
+from functools import lru_cache
+from typing import List
+
+# Statements that build the schema replica; everything else is only compiled
+SCHEMA_KEYWORDS = ("CREATE", "DROP", "ALTER")
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a script into statements where the sqlite3 shell would, honouring strings and trigger bodies."""
+    statements = []
+    buffer = ""
+    for piece in sql.split(";"):
+        buffer += piece + ";"
+        if sqlite3.complete_statement(buffer):
+            if buffer.strip(" \t\r\n;"):
+                statements.append(buffer.strip())
+            buffer = ""
+    rest = buffer[:-1].strip()
+    if rest:
+        # Unterminated tail: the shell still runs it at end of input
+        statements.append(rest)
+    return statements
+
+
+@lru_cache(maxsize=4096)
+def is_valid_sql(sql: str) -> bool:
+    """
+    Whether every statement of `sql` parses and binds, checked in-process on an empty
+    in-memory database: schema statements are executed to build the replica, the others
+    are only compiled through EXPLAIN, so no query actually runs.
+    """
+    conn = sqlite3.connect(":memory:")
+    try:
+        for statement in split_statements(sql):
+            if statement.startswith("."):
+                continue  # shell dot-command
+            head = statement.lstrip("( \t\r\n")[:7].upper()
+            if head.startswith(SCHEMA_KEYWORDS) or head == "EXPLAIN":
+                conn.execute(statement)
+            else:
+                conn.execute("EXPLAIN " + statement)
+        return True
+    except (sqlite3.Error, sqlite3.Warning, ValueError):
+        return False
+    finally:
+        conn.close()
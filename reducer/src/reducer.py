@@ -1,5 +1,8 @@
 from sqlglot import parse, exp, tokenize
 from src.scripts import run_test
+from src.db_reducer import reduce_database
+from src.precheck import is_valid_sql
+import src.scripts as scripts
 from typing import List, Optional, Set, Tuple, Dict
 import copy
 import re
@@ -1015,8 +1018,14 @@ def reduce_table_definition(statements: List[exp.Expression], test_script: str,
         reduced_statements.append(stmt)
     return reduced_statements
 
-def reduce_query(query_path: str, test_script: str, dry_run: bool = False):
-    """Main query reduction function with enhanced error handling."""
+def reduce_query(query_path: str, test_script: str, dry_run: bool = False, db_path: Optional[str] = None):
+    """
+    Main query reduction function with enhanced error handling.
+
+    With `db_path` (the fixture database the query was found on, e.g. bugs/test.db), its
+    data is reduced first and the query becomes self-contained: a minimal CREATE+INSERT
+    prelude followed by the query, which every later step shrinks further.
+    """
     print(f"[INFO] Starting query reduction for: {query_path}")
     try:
         with open(query_path) as f:
@@ -1025,6 +1034,21 @@ def reduce_query(query_path: str, test_script: str, dry_run: bool = False):
         print(f"[ERROR] Failed to read query file: {e}")
         return
 
+    if db_path:
+        # The query needs the fixture's tables, which the pre-check replica only gets from the prelude
+        scripts.precheck = False
+        try:
+            prelude = reduce_database(db_path, full_sql, test_script, dry_run)
+            if prelude is not None:
+                full_sql = prelude + "\n" + full_sql
+        except Exception as e:
+            print(f"[ERROR] Database reduction failed: {e}")
+
+    # Candidates are pre-checked locally only if the original query passes the check itself
+    scripts.precheck = is_valid_sql(full_sql)
+    if not scripts.precheck:
+        print("[WARNING] Query does not pass the local validity check, every candidate goes to the test script")
+
     tracker = ReductionTracker(full_sql)
     print(f"[INFO] Initial query has {tracker.initial_tokens} tokens")
 
@@ -1124,5 +1148,8 @@ def reduce_query(query_path: str, test_script: str, dry_run: bool = False):
         print(f"[ERROR] Parentheses reduction failed: {e}")
 
     tracker.print_summary()
+    if scripts.stats["rejected"]:
+        print(f"\n[INFO] Pre-check rejected {scripts.stats['rejected']} of {scripts.stats['candidates']} candidates without running the test script")
     print("\n[INFO] Final reduced query:")
-    print(current_sql)
\ No newline at end of file
+    print(current_sql)
+    return current_sql
\ No newline at end of file
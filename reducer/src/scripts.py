@@ -1,8 +1,18 @@
 import subprocess
 import tempfile
 import os
+from src.precheck import is_valid_sql
+
+# Reject candidates that do not even parse or bind locally, before paying for the test script.
+# Turned off for queries whose original already fails the check (see reduce_query).
+precheck = True
+stats = {"candidates": 0, "rejected": 0}
 
 def run_test(query: str, test_script: str) -> bool:
+    stats["candidates"] += 1
+    if precheck and not is_valid_sql(query):
+        stats["rejected"] += 1
+        return False
     path = write_temp_query(query)
     result = subprocess.run(["bash", test_script, path])
     os.unlink(path)
@@ -0,0 +1,110 @@
+import os
+import time
+import zlib
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# One byte per slot; sqlite3.c has ~270k lines, so collisions between files stay rare
+MAP_SIZE = 1 << 20
+# Seconds between two snapshots of the map
+SNAPSHOT_SECONDS = 60.0
+SNAPSHOT_MAGIC = b"SQLCOV1\0"
+
+
+def line_slots(sources, size=MAP_SIZE):
+    """
+    Map slots of the executed lines in `sources` ({file: [line, ...]}, see
+    scripts.parse_line_coverage). The file offset is a CRC so that every process
+    agrees on it, unlike the salted hash().
+    """
+    slots = [np.asarray(lines, dtype=np.int64) + zlib.crc32(name.encode()) for name, lines in sources.items() if lines]
+    if not slots:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(slots) % size)
+
+
+class CoverageMap:
+    """
+    Campaign-wide map of the source lines ever executed, shared by all fuzzing processes.
+
+    With a `name`, the map lives in a multiprocessing.shared_memory segment: the first
+    process creates it and the others attach, so each one checks novelty against what
+    every worker has covered, without any IPC round trip. A slot is only ever written
+    from 0 to 1, so concurrent merges behave like an atomic OR and need no lock: two
+    processes racing on the same line may both count it as new, but no line is lost.
+    Without a name, the map is private to the process.
+
+    `known` keeps the slots this process already merged: the .gcda counters are
+    cumulative, so every measurement reports them again.
+    """
+    def __init__(self, name=None, size=MAP_SIZE, snapshot_path=None, snapshot_seconds=SNAPSHOT_SECONDS):
+        self.name = name
+        self.size = size
+        self.shm = None
+        self.owner = True
+        if name is None:
+            self.map = np.zeros(size, dtype=np.uint8)
+        else:
+            try:
+                self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+            except FileExistsError:
+                self.shm = shared_memory.SharedMemory(name)
+                self.owner = False
+                # Before Python 3.13 attaching registers the segment too, and the tracker would
+                # unlink it when this process exits: only its creator may do that
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+            self.map = np.ndarray((size,), dtype=np.uint8, buffer=self.shm.buf)
+        self.known = np.zeros(size, dtype=bool)
+        self.snapshot_path = snapshot_path
+        self.snapshot_seconds = snapshot_seconds
+        self.last_snapshot = time.perf_counter()
+        self.merges = 0
+
+    def merge(self, sources):
+        """Merge the lines executed so far into the map and return how many no process had covered."""
+        slots = line_slots(sources, self.size)
+        slots = slots[~self.known[slots]]
+        self.known[slots] = True
+        fresh = slots[self.map[slots] == 0]
+        self.map[fresh] = 1
+        self.merges += 1
+        return len(fresh)
+
+    @property
+    def covered(self):
+        return int(np.count_nonzero(self.map))
+
+    def snapshot(self, path=None):
+        """Write the map as a compressed bitmap; rewritten atomically, so other processes may share the file."""
+        path = path or self.snapshot_path
+        data = SNAPSHOT_MAGIC + zlib.compress(np.packbits(self.map != 0).tobytes())
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.last_snapshot = time.perf_counter()
+
+    def maybe_snapshot(self):
+        if self.snapshot_path and time.perf_counter() - self.last_snapshot >= self.snapshot_seconds:
+            self.snapshot()
+
+    def load(self, path=None):
+        """OR a snapshot into the map, to resume a campaign. Returns the number of covered slots read."""
+        with open(path or self.snapshot_path, "rb") as f:
+            data = f.read()
+        if not data.startswith(SNAPSHOT_MAGIC):
+            raise ValueError(f"{path or self.snapshot_path} is not a coverage map snapshot")
+        bits = np.unpackbits(np.frombuffer(zlib.decompress(data[len(SNAPSHOT_MAGIC):]), dtype=np.uint8))
+        slots = np.flatnonzero(bits[:self.size])
+        self.map[slots] = 1
+        return len(slots)
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.map = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
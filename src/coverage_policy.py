@@ -0,0 +1,61 @@
+import random
+
+# Runs failing the cheap tier that still get measured, so the tier cannot hide all new coverage
+SAMPLE_RATE = 0.05
+# Cheap signals a run must pass before gcov measures it
+SIGNALS = ("always", "status", "digest", "plan")
+
+
+class CoveragePolicy:
+    """
+    Tiered coverage measurement: gcov only runs after a cheap first tier passed.
+
+    "always": every run is measured.
+    "status": the run exited cleanly (no syntax error, crash or timeout).
+    "digest": clean, and its output digest was never seen before.
+    "plan": clean, and its query plan or opcode pairs were new (see plan_feedback).
+
+    Runs failing the tier are measured anyway with probability `sample_rate`. Since the
+    .gcda counters are cumulative, lines covered by an unmeasured run still show up at
+    the next measurement, credited to that run. `coverage` holds the last measured value.
+    """
+    def __init__(self, signal="status", sample_rate=SAMPLE_RATE, rng=None):
+        if signal not in SIGNALS:
+            raise ValueError(f"Unknown coverage signal {signal!r}, expected one of {', '.join(SIGNALS)}")
+        self.signal = signal
+        self.sample_rate = sample_rate
+        self.rng = rng or random.Random()
+        self.digests = set()
+        self.coverage = 0.0
+        self.measured = 0
+        self.sampled = 0
+        self.skipped = 0
+
+    def digest_novel(self, key):
+        if key in self.digests:
+            return False
+        self.digests.add(key)
+        return True
+
+    def should_measure(self, clean, novel=False):
+        """Whether to run gcov after a run; `novel` is the run's digest or plan novelty."""
+        if self.signal == "always":
+            passed = True
+        elif self.signal == "status":
+            passed = clean
+        else:
+            passed = clean and novel
+        if passed:
+            self.measured += 1
+            return True
+        if self.sample_rate and self.rng.random() < self.sample_rate:
+            self.sampled += 1
+            return True
+        self.skipped += 1
+        return False
+
+    @property
+    def saved(self):
+        """Share of runs that skipped gcov."""
+        total = self.measured + self.sampled + self.skipped
+        return self.skipped / total if total else 0.0
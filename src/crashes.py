@@ -0,0 +1,119 @@
+import hashlib
+import json
+import re
+import time
+
+# Frames of the crashing stack that make up a bucket signature
+SIGNATURE_FRAMES = 5
+# Runs that must crash again before a crash is exported
+CONFIRM_RUNS = 2
+
+# "#0 0x4f2b1c in sqlite3VdbeExec /src/sqlite3.c:90123:5" (sanitizers) or "#0  0x... in sqlite3VdbeExec (p=...) at sqlite3.c:90123" (gdb)
+FRAME = re.compile(rb"^\s*#(\d+)\s+(?:0x[0-9a-fA-F]+\s+in\s+)?([A-Za-z_][\w:.<>~]*)", re.MULTILINE)
+# Sanitizer runtime and libc frames above the faulting function
+IGNORED_FRAMES = ("__asan", "__sanitizer", "__interceptor", "__ubsan", "raise", "abort", "__GI_", "__libc", "__pthread")
+CRASH_MARKERS = (b"Segmentation fault", b"Aborted", b"AddressSanitizer", b"UndefinedBehaviorSanitizer", b"runtime error:")
+ADDRESSES = re.compile(rb"0x[0-9a-fA-F]+")
+
+
+def crashed(stderr):
+    return any(marker in stderr for marker in CRASH_MARKERS)
+
+
+def stack_frames(stderr, count=SIGNATURE_FRAMES):
+    """Names of the top `count` functions of the first symbolized stack trace in `stderr`."""
+    frames = []
+    for match in FRAME.finditer(stderr):
+        if match.group(1) == b"0" and frames:
+            break  # a second trace (e.g. the allocation site) starts over at #0
+        name = match.group(2).decode()
+        if not name.startswith(IGNORED_FRAMES):
+            frames.append(name)
+        if len(frames) == count:
+            break
+    return frames
+
+
+def crash_signature(stderr, sql=""):
+    """
+    Bucket key of a crash: the hash of its top stack frames. When the build prints no
+    symbolized trace, the last stderr line (addresses masked) is the same for every plain
+    segfault, so the key also covers `sql`: each crashing query gets its own bucket.
+    """
+    frames = stack_frames(stderr)
+    if frames:
+        key = "\n".join(frames).encode()
+    else:
+        lines = stderr.strip().splitlines()
+        key = (ADDRESSES.sub(b"0x?", lines[-1]) if lines else b"") + b"\n" + sql.encode()
+    return hashlib.blake2b(key, digest_size=8).hexdigest(), frames
+
+
+class Bucket:
+    __slots__ = ("index", "signature", "frames", "sql", "seconds", "hits")
+
+    def __init__(self, index, signature, frames, sql, seconds):
+        self.index = index
+        self.signature = signature
+        self.frames = frames
+        self.sql = sql
+        self.seconds = seconds
+        self.hits = 1
+
+    def to_dict(self):
+        return {"index": self.index, "frames": self.frames, "hits": self.hits, "size": len(self.sql), "seconds": self.seconds}
+
+
+class CrashTriage:
+    """
+    Deduplicates crashes by stack signature before they are exported.
+
+    Each crash is re-run on the `symbolized` build (a sanitizer or debug binary whose
+    stderr carries a stack trace, or the crashing binary itself if there is none) until it
+    crashed CONFIRM_RUNS times. Its top frames pick the bucket, and every bucket keeps a
+    single representative: the smallest query, the fastest one among equal sizes. Without
+    frames there is no deduplication: every distinct crashing query is its own bucket.
+    """
+    def __init__(self, backend, symbolized, db_path, timeout=None):
+        self.backend = backend
+        self.symbolized = symbolized
+        self.db_path = db_path
+        self.timeout = timeout
+        self.buckets = {}
+        self.flaky = 0
+        self.duplicates = 0
+
+    async def triage(self, sql):
+        """
+        Returns (bucket, is_new, is_representative), or None when the crash does not reproduce.
+        The caller (re)exports the bucket's finding when the query became its representative.
+        """
+        sqlite_dir, sqlite_binary = self.symbolized
+        stderr = b""
+        seconds = None
+        for _ in range(CONFIRM_RUNS):
+            start = time.perf_counter()
+            _, stderr = await self.backend.run_query_async(sqlite_dir, sqlite_binary, sql, db_path=self.db_path, timeout=self.timeout)
+            elapsed = time.perf_counter() - start
+            if not crashed(stderr):
+                self.flaky += 1
+                return None
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+        signature, frames = crash_signature(stderr, sql)
+        bucket = self.buckets.get(signature)
+        if bucket is None:
+            bucket = self.buckets[signature] = Bucket(len(self.buckets), signature, frames, sql, seconds)
+            return bucket, True, True
+
+        bucket.hits += 1
+        self.duplicates += 1
+        if (len(sql), seconds) < (len(bucket.sql), bucket.seconds):
+            bucket.sql = sql
+            bucket.seconds = seconds
+            return bucket, False, True
+        return bucket, False, False
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({sig: b.to_dict() for sig, b in self.buckets.items()}, f, indent=2)
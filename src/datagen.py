@@ -0,0 +1,163 @@
+import string
+import numpy as np
+from schema import ColumnType, ConstraintType
+
+# Placeholder written to CSV files for NULL cells, turned into NULL while copying out of the staging table
+CSV_NULL = "\\N"
+
+LETTERS = np.frombuffer(string.ascii_letters.encode(), dtype=np.uint8)
+
+EDGE_VALUES = {
+    ColumnType.INTEGER: [0, -1, 1, 2**31 - 1, -2**31, 2**63 - 1, -2**63],
+    ColumnType.REAL: [-0.0, 0.0, 1e308, -1e308, 5e-324, 2.0**53, 0.1],
+    ColumnType.TEXT: ["", " ", "'", "NULL", "0", "x" * 4096, "éè"],
+    ColumnType.BOOLEAN: [0, 1],
+}
+
+
+class Distribution:
+    """
+    Knobs for columnar bulk data generation.
+
+    null_ratio (float): Fraction of NULL cells in nullable columns.
+    duplicate_ratio (float): Fraction of cells overwritten with a value drawn from the same column.
+    skew (float): 0 for uniform values, otherwise the Zipf exponent offset (higher is more skewed).
+    edge_ratio (float): Fraction of cells replaced by edge values (-0.0, huge integers, long strings...).
+    int_range (tuple): Inclusive bounds of INTEGER values.
+    real_range (tuple): Bounds of REAL values.
+    text_length (int): Length of generated TEXT values.
+    """
+    def __init__(self, null_ratio=0.5, duplicate_ratio=0.0, skew=0.0, edge_ratio=0.0,
+                 int_range=(0, 100), real_range=(0, 100), text_length=5):
+        self.null_ratio = null_ratio
+        self.duplicate_ratio = duplicate_ratio
+        self.skew = skew
+        self.edge_ratio = edge_ratio
+        self.int_range = int_range
+        self.real_range = real_range
+        self.text_length = text_length
+
+
+def generate_columns(columns, count, seed=None, distribution=None):
+    """
+    Generate `count` rows for the given columns at once from a single seed.
+    Returns one (values, nulls) pair of arrays per column.
+    """
+    dist = distribution or Distribution()
+    rng = np.random.default_rng(seed)
+    return [generate_column(rng, col, count, dist) for col in columns]
+
+
+def generate_column(rng, col, count, dist):
+    constraints = {ctype for ctype, _ in col.constraints}
+    unique = bool(constraints & {ConstraintType.PRIMARY_KEY, ConstraintType.UNIQUE})
+    col_type = col.col_type
+
+    if col_type == ColumnType.INTEGER:
+        low, high = dist.int_range
+        if unique:
+            values = low + rng.permutation(count).astype(np.int64)
+        elif dist.skew > 0:
+            values = low + (rng.zipf(1.0 + dist.skew, count) - 1) % (high - low + 1)
+        else:
+            values = rng.integers(low, high, count, endpoint=True)
+        values = values.astype(object)
+    elif col_type == ColumnType.REAL:
+        low, high = dist.real_range
+        if unique:
+            values = low + rng.permutation(count) / 100.0
+        elif dist.skew > 0:
+            values = low + ((rng.zipf(1.0 + dist.skew, count) - 1) % int((high - low) * 100 + 1)) / 100.0
+        else:
+            values = np.round(rng.uniform(low, high, count), 2)
+        values = values.astype(object)
+    elif col_type == ColumnType.TEXT:
+        codes = rng.integers(0, len(LETTERS), (count, dist.text_length))
+        values = LETTERS[codes].view(f"S{dist.text_length}").ravel().astype(str).astype(object)
+        if unique:
+            values = values + np.arange(count).astype(str).astype(object)
+    elif col_type == ColumnType.BOOLEAN:
+        values = rng.integers(0, 1, count, endpoint=True).astype(object)
+    else:
+        raise ValueError(f"Unsupported column type: {col_type}")
+
+    if not unique:
+        if dist.duplicate_ratio > 0:
+            dup = rng.random(count) < dist.duplicate_ratio
+            values[dup] = values[rng.integers(0, count, int(dup.sum()))]
+        if dist.edge_ratio > 0:
+            edge = rng.random(count) < dist.edge_ratio
+            edges = np.array(EDGE_VALUES[col_type], dtype=object)
+            values[edge] = edges[rng.integers(0, len(edges), int(edge.sum()))]
+
+    if ConstraintType.NOT_NULL in constraints or ConstraintType.PRIMARY_KEY in constraints:
+        nulls = np.zeros(count, dtype=bool)
+    else:
+        nulls = rng.random(count) < dist.null_ratio
+    return values, nulls
+
+
+def _sql_literals(values, nulls, col_type):
+    if col_type == ColumnType.TEXT:
+        # Per-cell escaping: fixed-width unicode arrays would be sized by the longest edge string
+        lits = np.array(["'" + v.replace("'", "''") + "'" for v in values], dtype=object)
+    elif col_type == ColumnType.REAL:
+        lits = np.array([repr(float(v)) for v in values], dtype=object)
+    else:
+        lits = values.astype(str).astype(object)
+    lits[nulls] = "NULL"
+    return lits
+
+
+def columns_to_sql(table_name, columns, data, batch_size=500):
+    """Emit multi-row INSERT statements for the generated columns."""
+    if not data:
+        return []
+    cells = [_sql_literals(values, nulls, col.col_type) for col, (values, nulls) in zip(columns, data)]
+    rows = cells[0]
+    for lits in cells[1:]:
+        rows = rows + ", " + lits
+    rows = "(" + rows + ")"
+    return [
+        f"INSERT INTO {table_name} VALUES {', '.join(rows[i:i + batch_size])};"
+        for i in range(0, len(rows), batch_size)
+    ]
+
+
+def columns_to_csv(columns, data):
+    """Emit the generated columns as CSV text for the sqlite3 shell's `.import`."""
+    if not data:
+        return ""
+    cells = []
+    for col, (values, nulls) in zip(columns, data):
+        if col.col_type == ColumnType.REAL:
+            text = np.array([repr(float(v)) for v in values], dtype=object)
+        elif col.col_type == ColumnType.TEXT:
+            text = np.array(['"' + v.replace('"', '""') + '"' for v in values], dtype=object)
+        else:
+            text = values.astype(str).astype(object)
+        text[nulls] = CSV_NULL
+        cells.append(text)
+    rows = cells[0]
+    for text in cells[1:]:
+        rows = rows + "," + text
+    return "\n".join(rows) + "\n"
+
+
+def csv_import_sql(table_name, columns, csv_path):
+    """
+    sqlite3 shell commands importing a CSV from `columns_to_csv`. The shell imports every
+    field as text, so the placeholders would collide in UNIQUE columns and fail CHECKs:
+    the CSV lands in an untyped staging table and is copied over with its NULLs restored.
+    """
+    staging = f"{table_name}_import"
+    names = ", ".join(col.name for col in columns)
+    values = ", ".join(f"NULLIF({col.name}, '{CSV_NULL}')" for col in columns)
+    return [
+        f"CREATE TABLE {staging} ({names});",
+        ".mode csv",
+        f".import {csv_path} {staging}",
+        ".mode list",
+        f"INSERT INTO {table_name} ({names}) SELECT {values} FROM {staging};",
+        f"DROP TABLE {staging};",
+    ]
@@ -0,0 +1,103 @@
+import hashlib
+import re
+import tempfile
+
+MASK64 = (1 << 64) - 1
+# Bytes of kept output held in memory before it spills to a temporary file
+SPOOL_MEMORY = 1 << 20
+
+ORDER_BY = re.compile(r"\bORDER\s+BY\b", re.IGNORECASE)
+PARENTHESIZED = re.compile(r"\([^()]*\)")
+
+
+def has_order_by(sql):
+    """Whether the outermost query orders its rows; ORDER BY in subqueries or windows doesn't count."""
+    prev = None
+    while prev != sql:
+        prev, sql = sql, PARENTHESIZED.sub("", sql)
+    return ORDER_BY.search(sql) is not None
+
+
+class OutputDigest:
+    """
+    Incremental digest of sqlite3 shell output, fed chunk by chunk while the pipe is read.
+
+    With `ordered`, the digest covers the lines in order. Otherwise it is a multiset
+    digest (the sum of per-line hashes), so two outputs holding the same rows in a
+    different order compare equal. Lines starting with `watch` set the `seen` flag.
+
+    With `keep`, the raw output is also spooled as it streams by, so that a mismatch can
+    be exported with the very output that was digested; `discard()` drops it otherwise.
+    """
+    __slots__ = ("ordered", "watch", "hash", "total", "lines", "size", "seen", "spool", "_carry", "_blank")
+
+    def __init__(self, ordered=True, watch=None, keep=False):
+        self.ordered = ordered
+        self.watch = watch
+        self.hash = hashlib.blake2b(digest_size=16)
+        self.total = 0
+        self.lines = 0
+        self.size = 0
+        self.seen = False
+        self.spool = tempfile.SpooledTemporaryFile(SPOOL_MEMORY) if keep else None
+        self._carry = b""
+        self._blank = 0
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+        if self.spool is not None:
+            self.spool.write(chunk)
+        lines = (self._carry + chunk).split(b"\n")
+        self._carry = lines.pop()
+        for line in lines:
+            self._line(line)
+
+    def _line(self, line):
+        line = line.rstrip(b"\r")
+        if not line:
+            # Blank lines only count between two non-blank ones, as in stripped full outputs
+            self._blank += bool(self.lines)
+            return
+        while self._blank:
+            self._blank -= 1
+            self._add(b"")
+        self._add(line)
+
+    def _add(self, line):
+        if self.watch is not None and line.startswith(self.watch):
+            self.seen = True
+        self.lines += 1
+        if self.ordered:
+            self.hash.update(line)
+            self.hash.update(b"\n")
+        else:
+            self.total = (self.total + int.from_bytes(hashlib.blake2b(line, digest_size=8).digest(), "little")) & MASK64
+
+    def finish(self):
+        if self._carry:
+            self._line(self._carry)
+            self._carry = b""
+        return self
+
+    def output(self):
+        """The kept output, stripped like the shell outputs of run_query."""
+        self.spool.seek(0)
+        return self.spool.read().strip()
+
+    def discard(self):
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+
+    def hexdigest(self):
+        if self.ordered:
+            return self.hash.hexdigest()
+        return f"{self.total:016x}"
+
+    def __eq__(self, other):
+        return isinstance(other, OutputDigest) and self.ordered == other.ordered and \
+            self.lines == other.lines and self.hexdigest() == other.hexdigest()
+
+    def __repr__(self):
+        kind = "ordered" if self.ordered else "multiset"
+        return f"<OutputDigest ({kind}, {self.lines} lines, {self.size} bytes, {self.hexdigest()})>"
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+
+# Queued findings allowed before `record` blocks the fuzzing loop
+MAX_PENDING = 1024
+# File name prefix of each kind of finding
+PREFIXES = {"logical": "bug", "crash": "crash", "hang": "hang"}
+
+
+def db_snapshot_id(path):
+    """Content hash of a database file, identifying the exact data a finding ran against."""
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _text(value):
+    return value.decode(errors="replace") if isinstance(value, bytes) else value
+
+
+class FindingsWriter:
+    """
+    Writes bug and crash reproducers to `local_dir` from a background thread, so the
+    fuzzing loop never waits on the disk.
+
+    Each finding is saved as bug{i}.sql / crash{i}.sql / hang{i}.sql. When `details` is
+    set, a sidecar .json stores the outputs and stderr of both binaries, the coverage and
+    the snapshot id of the database the query ran against.
+    """
+    def __init__(self, local_dir="bugs", details=True, snapshot_id=None):
+        self.local_dir = local_dir
+        self.details = details
+        self.snapshot_id = snapshot_id
+        self.written = 0
+        self.errors = 0
+        os.makedirs(local_dir, exist_ok=True)
+        self.pending = queue.Queue(MAX_PENDING)
+        self.thread = threading.Thread(target=self._run, name="findings-writer", daemon=True)
+        self.thread.start()
+
+    def record(self, kind, i, sql, **details):
+        """Queue finding number `i` of `kind` (see PREFIXES) with optional details."""
+        self.pending.put((kind, i, sql, details))
+
+    def _run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                self.pending.task_done()
+                return
+            try:
+                self._write(*item)
+                self.written += 1
+            except OSError as e:
+                self.errors += 1
+                print(f"Error exporting finding: {e}")
+            finally:
+                self.pending.task_done()
+
+    def _write(self, kind, i, sql, details):
+        stem = f"{PREFIXES[kind]}{i}"
+        with open(os.path.join(self.local_dir, f"{stem}.sql"), "w") as f:
+            f.write(sql)
+        if self.details:
+            meta = {"kind": kind, "db_snapshot": self.snapshot_id}
+            meta.update({key: _text(value) for key, value in details.items()})
+            with open(os.path.join(self.local_dir, f"{stem}.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+
+    def flush(self):
+        """Block until every queued finding is on disk."""
+        self.pending.join()
+
+    def close(self):
+        self.pending.put(None)
+        self.thread.join()
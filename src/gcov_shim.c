@@ -0,0 +1,14 @@
+/*
+** Exported wrappers around libgcov for the inprocess backend (see inprocess.py).
+**
+** A shared library built with --coverage carries its own copy of libgcov, whose entry
+** points are hidden: they cannot be resolved through dlsym, and another library's copy
+** would dump other counters. Append this file to sqlite3.c before building libsqlite3.so,
+** or link its object into the library. The sqlite3_ prefix keeps the wrappers in the
+** library's export list.
+*/
+extern void __gcov_dump(void);
+extern void __gcov_reset(void);
+
+__attribute__((visibility("default"))) void sqlite3_fuzz_gcov_dump(void){ __gcov_dump(); }
+__attribute__((visibility("default"))) void sqlite3_fuzz_gcov_reset(void){ __gcov_reset(); }
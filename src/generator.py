@@ -1,7 +1,15 @@
-from typing import List
+from typing import List, Tuple
 from sqlglot import parse_one, exp
 import copy
 import random
+from schema import SchemaIndex
+from scheduler import BASE_PROBS
+
+# Parts of a donor query that splice() can graft onto another one
+SPLICE_PARTS = ("where", "join", "projection", "group_by", "subquery")
+# SQLite aggregates some of which sqlglot parses as plain function calls (exp.Anonymous)
+SQLITE_AGGREGATES = {"TOTAL", "GROUP_CONCAT", "STRING_AGG", "JSON_GROUP_ARRAY", "JSON_GROUP_OBJECT",
+                     "JSONB_GROUP_ARRAY", "JSONB_GROUP_OBJECT"}
 
 class Generator:
     """
@@ -9,31 +17,119 @@ class Generator:
     targeting specific bug classes: crashes and logic bugs.
     """
 
-    def __init__(self, db_json: str):
+    def __init__(self, db_json: str, rng: random.Random = None):
         self.schema = db_json
+        # Every random decision goes through this stream, so mutants can be replayed from its seed
+        self.rng = rng or random.Random()
+        self.index = SchemaIndex(db_json)
         self.comparison_operators = [exp.EQ, exp.NEQ, exp.GT, exp.LT, exp.GTE, exp.LTE]
         self.aggregate_functions = [exp.Count, exp.Sum, exp.Avg, exp.Max, exp.Min]
+        # Probability of each mutation stage, retuned during a campaign (see scheduler.OperatorScheduler)
+        self.probs = dict(BASE_PROBS)
+        # Stages applied to each mutant of the last mutate_ast call
+        self.applied = []
 
     def mutate_query(self, sql: str, count: int) -> List[str]:
         """Dispatches to the appropriate mutation technique."""
         return self.generic_mutation(sql, count)
 
+    def mutate_entry(self, entry, count: int) -> List[Tuple[str, exp.Expression]]:
+        """
+        Mutate a queue entry from its memoized AST, returning (sql, ast) pairs so that
+        mutants admitted to the queue never have to be parsed again.
+        """
+        try:
+            original_ast = entry.ast
+        except Exception as e:
+            print(f"Failed to parse SQL: {e}")
+            return []
+        return self.mutate_ast(original_ast, count)
+
+    def splice_entries(self, entry, donor, count: int) -> List[Tuple[str, exp.Expression]]:
+        """Splice two queue entries from their memoized ASTs, see splice()."""
+        try:
+            recipient_ast, donor_ast = entry.ast, donor.ast
+        except Exception as e:
+            print(f"Failed to parse SQL: {e}")
+            return []
+        return self.splice(recipient_ast, donor_ast, count)
+
+    def metamorphic_queries(self, sql: str, ast: exp.Expression = None) -> List[Tuple[str, List[str]]]:
+        """
+        Derive metamorphic oracle cases from a mutant, as (kind, queries) pairs.
+
+        'tlp': the query without WHERE, followed by its WHERE p, WHERE NOT p and
+               WHERE p IS NULL partitions, whose rows must add up to the first one.
+        'norec': COUNT(*) with WHERE p, followed by the unoptimizable form that sums
+                 `p IS TRUE` over every row; both counts must match.
+        Only plain SELECTs with a WHERE clause and no grouping, aggregates, windows,
+        DISTINCT or LIMIT qualify; anything else yields no cases.
+        """
+        try:
+            ast = ast if ast is not None else parse_one(sql, error_level='IGNORE')
+        except Exception as e:
+            print(f"Failed to parse SQL: {e}")
+            return []
+
+        if not isinstance(ast, exp.Select) or not ast.args.get("where"):
+            return []
+        if any(ast.args.get(arg) for arg in ("distinct", "group", "having", "limit", "offset")):
+            return []
+        if any(e.find(exp.AggFunc, exp.Window) for e in ast.expressions):
+            return []
+        if any(f.name.upper() in SQLITE_AGGREGATES for e in ast.expressions for f in e.find_all(exp.Anonymous)):
+            return []
+
+        predicate = ast.args["where"].this
+        base = ast.copy()
+        base.set("where", None)
+        base.set("order", None)
+
+        def paren():
+            return exp.Paren(this=predicate.copy())
+
+        partitions = [
+            base.where(predicate.copy()),
+            base.where(exp.Not(this=paren())),
+            base.where(exp.Is(this=paren(), expression=exp.Null())),
+        ]
+        tlp = [q.sql(dialect="sqlite") for q in [base] + partitions]
+
+        counted = base.copy()
+        counted.set("expressions", [exp.Count(this=exp.Star())])
+        flagged = base.copy()
+        flagged.set("expressions", [exp.alias_(exp.Is(this=paren(), expression=exp.true()), "flag")])
+        norec = [
+            counted.where(predicate.copy()).sql(dialect="sqlite"),
+            exp.select("TOTAL(flag)").from_(flagged.subquery()).sql(dialect="sqlite"),
+        ]
+        return [("tlp", tlp), ("norec", norec)]
+
     # Helper function to get all columns from the schema
     def get_all_columns(self, ast):
-        tables = {t.this for t in ast.find_all(exp.Table)}
-        cols = []
-        for t in tables:
-            if t in self.schema:
-                cols.extend((col, typ) for col, typ in self.schema[t].items())
-        return cols
+        # Ordered de-duplication: set order varies with hash seeding and would break replay
+        tables = dict.fromkeys(t.name for t in ast.find_all(exp.Table))
+        return self.index.columns_of(tables)
+
+    def apply(self, stage):
+        """Whether to apply `stage`; stages always applied draw nothing from the stream."""
+        prob = self.probs[stage]
+        return prob >= 1.0 or self.rng.random() < prob
+
+    # Helper function to pick the table a mutant keeps when the table stage is skipped
+    def current_table(self, ast):
+        for table in ast.find_all(exp.Table):
+            if table.name in self.index.column_names:
+                return table.name
+        return self.rng.choice(self.index.tables)
 
     # Helper function to update all columns in the AST
     def update_all_columns(self, ast, new_table):
-        valid_columns = list(self.schema[new_table].keys())
+        valid_columns = self.index.column_names[new_table]
 
         for column in ast.find_all(exp.Column):
             # Pick a new valid column name
-            new_col_name = random.choice(valid_columns)
+            new_col_name = self.rng.choice(valid_columns)
             # Replace with new column (optionally qualified)
             column.set("this", new_col_name)
             if column.args.get("table"):
@@ -50,17 +146,34 @@ class Generator:
             print(f"Failed to parse SQL: {e}")
             return []
 
+        return [mutant_sql for mutant_sql, _ in self.mutate_ast(original_ast, count)]
+
+    def mutate_ast(self, original_ast: exp.Expression, count: int) -> List[Tuple[str, exp.Expression]]:
+        """
+        Apply the generic mutation stages to an already parsed query.
+        The original AST is left untouched. The stages applied to each mutant are
+        listed in `self.applied`, in the order of the returned mutants.
+        """
         mutations = []
+        self.applied = []
 
         for _ in range(count):
             mutated_ast = copy.deepcopy(original_ast)
+            applied = []
 
             # --- 1. Replace table and SELECT * or project subset of columns ---
             select = mutated_ast.find(exp.Select)
-            table = random.choice(list(self.schema.keys()))
-            table_expr = exp.Table(this=table)
-            mutated_ast.set("from", exp.From(this=table_expr))
-            self.update_all_columns(mutated_ast, table)
+            if not self.apply("table"):
+                table = self.current_table(mutated_ast)
+                table_expr = exp.Table(this=exp.to_identifier(table))
+                # The projection is only rewritten along with the table
+                select = None
+            else:
+                applied.append("table")
+                table = self.rng.choice(self.index.tables)
+                table_expr = exp.Table(this=exp.to_identifier(table))
+                mutated_ast.set("from", exp.From(this=table_expr))
+                self.update_all_columns(mutated_ast, table)
 
 
             if select:
@@ -68,30 +181,38 @@ class Generator:
                 has_join = any(mutated_ast.find_all(exp.Join))
                 if not has_join:
                     # Replace SELECT * or existing columns
-                    if random.random() < 0.2:
+                    if self.rng.random() < 0.2:
                         # Keep SELECT * (randomly)
                         select.set("expressions", [exp.Star()])
                     else:
                         # Use a random subset of columns
-                        columns = list(self.schema[table].items())
+                        columns = self.index.columns[table]
                         # columns = self.get_all_columns(mutated_ast)
-                        col_subset = random.sample(columns, k=random.randint(1, len(columns)))
+                        col_subset = self.rng.sample(columns, k=self.rng.randint(1, len(columns)))
                         select.set("expressions", [exp.Column(this=col_name, table=table_expr) for col_name, _ in col_subset])
 
 
             # --- 2. Mutate literals using type-aware replacements ---
-            for literal in mutated_ast.find_all(exp.Literal):
+            literals = ()
+            if self.apply("literals"):
+                applied.append("literals")
+                literals = mutated_ast.find_all(exp.Literal)
+            for literal in literals:
                 if literal.is_number:
-                    new_num = random.randint(1, 100)
+                    new_num = self.rng.randint(1, 100)
                     literal.replace(exp.Literal.number(str(new_num)))
                 elif literal.is_string:
-                    new_str = random.choice(["'foo'", "'bar'", "'pivot'", "'test'"])
+                    new_str = self.rng.choice(["'foo'", "'bar'", "'pivot'", "'test'"])
                     literal.replace(exp.Literal.string(new_str))
 
 
             # --- 3. Flip comparison operators ---
             columns = self.get_all_columns(mutated_ast)
-            for comp in mutated_ast.find_all(exp.Condition):
+            conditions = ()
+            if self.apply("operators"):
+                applied.append("operators")
+                conditions = mutated_ast.find_all(exp.Condition)
+            for comp in conditions:
                 left = comp.args.get("this")
                 right = comp.args.get("expression")
 
@@ -101,29 +222,30 @@ class Generator:
                 # Skip boolean and NULL expressions
                 if (isinstance(right, (exp.Boolean, exp.Null, exp.Is))):
                     continue
-                col_name, _ = random.choice(columns)
-                new_op_cls = random.choice(self.comparison_operators)
+                col_name, _ = self.rng.choice(columns)
+                new_op_cls = self.rng.choice(self.comparison_operators)
                 comp.replace(new_op_cls(this=exp.Column(this=col_name, table=table_expr), expression=right))
 
 
             # --- 4. Add smart WHERE logic using schema ---
             where = mutated_ast.find(exp.Where)
-            if where and random.random() < 0.45:
+            if where and self.apply("where"):
+                applied.append("where")
                 # Add a AND/OR condition
-                op_cls = random.choice([exp.And, exp.Or])
-                bool_val = random.choice(["TRUE", "FALSE"])
-                if random.random() < 0.35:
+                op_cls = self.rng.choice([exp.And, exp.Or])
+                bool_val = exp.Boolean(this=self.rng.choice([True, False]))
+                if self.rng.random() < 0.35:
                     # Add a random TRUE/FALSE
-                    expr = exp.Literal(this=bool_val, is_string=False)
+                    expr = bool_val
                 else:
                     # Add a random (NOT) IS NULL/TRUE/FALSE
-                    col_name, _ = random.choice(columns)
+                    col_name, _ = self.rng.choice(columns)
                     expr = exp.Is(
                         this=exp.Column(this=col_name),
-                        expression= exp.Null() if random.random() < 0.7 else bool_val
+                        expression= exp.Null() if self.rng.random() < 0.7 else bool_val
                     )
                 # Randomly wrap with NOT
-                if random.random() < 1:
+                if self.rng.random() < 1:
                     expr = exp.Not(this=expr)
 
                 new_condition = op_cls(this=where.this, expression=expr)
@@ -136,52 +258,45 @@ class Generator:
                 # JOIN type mutation
                 join_nodes = list(mutated_ast.find_all(exp.Join))
                 for join in join_nodes:
-                    new_type = random.choice(["inner", "left", "cross"])
+                    new_type = self.rng.choice(["inner", "left", "cross"])
                     join.set("kind", new_type)
 
                 # JOIN insertion
-                if (isinstance(mutated_ast, exp.Select) and random.random() < 0.2):
+                if (isinstance(mutated_ast, exp.Select) and self.apply("join")):
                     current_table = table  # use consistent table
-                    current_schema = self.schema[current_table]
-                    other_tables = [t for t in self.schema if t != current_table]
+                    other_tables = self.index.other_tables[current_table]
 
                     if not other_tables:
                         continue  # No other table to join
 
-                    join_table = random.choice(list(self.schema.keys()))  # initially choose any table
-                    join_schema = self.schema[join_table]
-
+                    join_table = self.rng.choice(self.index.tables)  # initially choose any table
 
                     # Only allow ON if tables are different
-                    join_table_name = random.choice(other_tables)
+                    join_table_name = self.rng.choice(other_tables)
                     alias = f"{join_table_name}_dup"
-                    join_table = exp.Table(this=join_table, alias=alias) 
-                    join_schema = self.schema[join_table_name]
+                    join_table = exp.Table(this=exp.to_identifier(join_table), alias=alias) 
 
-                    compatible_pairs = [
-                        (col1, col2)
-                        for col1, type1 in current_schema.items()
-                        for col2, type2 in join_schema.items()
-                        if type1 == type2
-                    ]
+                    compatible_pairs = self.index.join_pairs(current_table, join_table_name)
 
                     if not compatible_pairs:
                         continue  # skip if no valid join pair
 
-                    col1, col2 = random.choice(compatible_pairs)
+                    col1, col2 = self.rng.choice(compatible_pairs)
                     on_condition = f"{current_table}.{col1} = {alias}.{col2}"
                     mutated_ast = mutated_ast.join(
                         join_table,
                         on=on_condition,
                         join_type=None
                     )
+                    applied.append("join")
 
 
             # --- 6. Random GROUP BY addition ---
             columns = self.get_all_columns(mutated_ast)
-            if isinstance(mutated_ast, exp.Select) and random.random() < 0.4:
+            if isinstance(mutated_ast, exp.Select) and self.apply("group_by"):
+                applied.append("group_by")
                 # Pick random GROUP BY columns
-                group_columns = random.sample(columns, k=random.randint(1, min(3, len(columns))))
+                group_columns = self.rng.sample(columns, k=self.rng.randint(1, min(3, len(columns))))
                 col_names = [col for col, _ in group_columns]
                 mutated_ast = mutated_ast.group_by(*col_names, append=False)
 
@@ -192,31 +307,32 @@ class Generator:
                         select_exprs.append(exp.Column(this=col_name, table=table_expr))
                     else:
                         # Randomly add an aggregate function
-                        agg_cls = random.choice(self.aggregate_functions)
+                        agg_cls = self.rng.choice(self.aggregate_functions)
                         select_exprs.append(agg_cls(this=exp.Column(this=col_name, table=table_expr)))
                 mutated_ast.set("expressions", select_exprs)
 
                 # Add a HAVING clause
                 agg_candidates = [col for col in columns if col not in col_names]
-                if agg_candidates and random.random() < 0.4:
-                    having_col = random.choice(agg_candidates)
-                    func_cls = random.choice(self.aggregate_functions)
-                    op_cls = random.choice(self.comparison_operators)
+                if agg_candidates and self.rng.random() < 0.4:
+                    having_col = self.rng.choice(agg_candidates)
+                    func_cls = self.rng.choice(self.aggregate_functions)
+                    op_cls = self.rng.choice(self.comparison_operators)
 
                     having_expr = op_cls(
                         this=func_cls(this=exp.Column(this=having_col[0], table=table_expr)),
-                        expression=exp.Literal.number(str(random.randint(1, 100)))
+                        expression=exp.Literal.number(str(self.rng.randint(1, 100)))
                     )
                     mutated_ast = mutated_ast.having(having_expr, append=False)
 
 
             # --- 7. Random ORDER BY addition ---
-            if isinstance(mutated_ast, exp.Select) and random.random() < 0.4:
-                order_columns = random.sample(columns, k=random.randint(1, min(3, len(columns))))
+            if isinstance(mutated_ast, exp.Select) and self.apply("order_by"):
+                applied.append("order_by")
+                order_columns = self.rng.sample(columns, k=self.rng.randint(1, min(3, len(columns))))
                 order_parts = []
 
                 for col_name, _ in order_columns:
-                    direction = random.choice(["ASC", "DESC"])
+                    direction = self.rng.choice(["ASC", "DESC"])
                     order_parts.append(f"{col_name} {direction}")
 
                 # Join parts into a single string, ex: "x DESC, y ASC"
@@ -225,14 +341,116 @@ class Generator:
 
 
             # --- 8. Random LIMIT addition ---
-            if not mutated_ast.args.get("limit") and random.random() < 0.3:
+            if not mutated_ast.args.get("limit") and self.apply("limit"):
+                applied.append("limit")
                 mutated_ast.set("limit", exp.Limit(
-                    expression=exp.Literal.number(str(random.randint(1, 50)))
+                    expression=exp.Literal.number(str(self.rng.randint(1, 50)))
                 ))
 
 
             # Convert back to SQL
-            mutations.append(mutated_ast.sql(dialect="sqlite"))
+            mutations.append((mutated_ast.sql(dialect="sqlite"), mutated_ast))
+            self.applied.append(tuple(applied))
+
+        return mutations
+
+    # Helper function to map the aliases of a SELECT's own tables to their names
+    def scope_of(self, select):
+        return {
+            table.alias_or_name: table.name
+            for table in select.find_all(exp.Table)
+            if table.name in self.index.column_names and table.find_ancestor(exp.Select) is select
+        }
+
+    # Helper function to rebind the columns of a grafted subtree to the tables in `scope`
+    def adapt_columns(self, node, scope):
+        aliases = {}
+        for alias, table in scope.items():
+            aliases.setdefault(table, alias)
+        for column in list(node.find_all(exp.Column)):
+            if column.find_ancestor(exp.Select) is not None:
+                continue  # resolved by its own subquery
+            owner = self.index.column_table.get(column.name)
+            if owner in aliases:
+                column.set("table", exp.to_identifier(aliases[owner]))
+                continue
+            # Same-typed column of the recipient's tables, or any of them
+            col_type = self.schema[owner][column.name] if owner else None
+            candidates = [(alias, col) for alias, table in scope.items()
+                          for col, typ in self.index.columns[table] if typ == col_type]
+            if not candidates:
+                candidates = [(alias, col) for alias, table in scope.items() for col in self.index.column_names[table]]
+            alias, col = self.rng.choice(candidates)
+            column.set("this", exp.to_identifier(col))
+            column.set("table", exp.to_identifier(alias))
+        return node
+
+    # Helper function to AND/OR a condition into a SELECT's WHERE clause
+    def add_condition(self, select, condition):
+        where = select.args.get("where")
+        if where:
+            # and_/or_ parenthesize connector operands, so the SQL parses back to this tree
+            combine = self.rng.choice([exp.and_, exp.or_])
+            condition = combine(where.this, condition, copy=False)
+        select.set("where", exp.Where(this=condition))
+
+    def splice(self, recipient_ast: exp.Expression, donor_ast: exp.Expression, count: int) -> List[Tuple[str, exp.Expression]]:
+        """
+        Crossover of two corpus queries: graft a part of `donor_ast` (its WHERE predicate,
+        a join, its projection, its GROUP BY/HAVING, or one of its subqueries as an EXISTS
+        condition) onto a copy of `recipient_ast`. Column references of the grafted part are
+        rebound to the recipient's tables, by owning table or else by type.
+        The grafted part of each mutant is listed in `self.applied`. Both ASTs are left untouched.
+        """
+        self.applied = []
+        if not isinstance(recipient_ast, exp.Select) or not isinstance(donor_ast, exp.Select):
+            return []
+        parts = [part for part, present in zip(SPLICE_PARTS, (
+            donor_ast.args.get("where"),
+            donor_ast.args.get("joins"),
+            not any(isinstance(e, exp.Star) for e in donor_ast.expressions),
+            donor_ast.args.get("group"),
+            True,
+        )) if present]
+
+        mutations = []
+        for _ in range(count):
+            mutated_ast = copy.deepcopy(recipient_ast)
+            scope = self.scope_of(mutated_ast)
+            if not scope:
+                return []
+            part = self.rng.choice(parts)
+
+            if part == "where":
+                self.add_condition(mutated_ast, self.adapt_columns(donor_ast.args["where"].this.copy(), scope))
+            elif part == "join":
+                join = self.rng.choice(donor_ast.args["joins"]).copy()
+                table = join.this
+                if isinstance(table, exp.Table) and table.name in self.index.column_names:
+                    alias = table.alias_or_name
+                    while alias in scope:
+                        alias = f"{alias}_s"
+                    if alias != table.name:
+                        table.set("alias", exp.TableAlias(this=exp.to_identifier(alias)))
+                    scope = {**scope, alias: table.name}
+                self.adapt_columns(join, scope)
+                mutated_ast.append("joins", join)
+            elif part == "projection":
+                mutated_ast.set("expressions", [self.adapt_columns(e.copy(), scope) for e in donor_ast.expressions])
+            elif part == "group_by":
+                mutated_ast.set("group", self.adapt_columns(donor_ast.args["group"].copy(), scope))
+                having = donor_ast.args.get("having")
+                mutated_ast.set("having", self.adapt_columns(having.copy(), scope) if having else None)
+            else:
+                subqueries = list(donor_ast.find_all(exp.Subquery))
+                inner = self.rng.choice(subqueries).this if subqueries else donor_ast
+                condition = exp.Exists(this=inner.copy())
+                if self.rng.random() < 0.5:
+                    condition = exp.Not(this=condition)
+                self.add_condition(mutated_ast, condition)
+
+            mutations.append((mutated_ast.sql(dialect="sqlite"), mutated_ast))
+            self.applied.append((part,))
 
         return mutations
 
@@ -0,0 +1,186 @@
+from typing import List
+import random
+from schema import SchemaIndex
+
+# Relative weight of each query shape produced by the grammar
+SHAPE_WEIGHTS = {
+    "simple": 4,
+    "join": 3,
+    "group": 3,
+    "window": 2,
+    "subquery": 2,
+}
+
+LITERALS = {
+    "INTEGER": ["0", "1", "-1", "5", "20", "50", "100", "9223372036854775807", "-9223372036854775808"],
+    "REAL": ["0.0", "-0.0", "0.5", "1.5", "50.25", "99.99", "1e308", "-1e-308"],
+    "TEXT": ["''", "'a'", "'foo'", "'bar'", "'pivot'", "'test'", "'A'", "'%'"],
+    "BOOLEAN": ["0", "1", "TRUE", "FALSE"],
+}
+
+COMPARISONS = ["=", "<>", "<", ">", "<=", ">=", "IS", "IS NOT"]
+AGGREGATES = ["COUNT", "SUM", "AVG", "MAX", "MIN", "TOTAL"]
+WINDOW_FUNCTIONS = ["ROW_NUMBER()", "RANK()", "DENSE_RANK()", "PERCENT_RANK()", "CUME_DIST()"]
+WINDOW_AGGREGATES = ["SUM", "COUNT", "AVG", "MAX", "MIN"]
+FRAMES = ["", " ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW", " ROWS BETWEEN 1 PRECEDING AND 1 FOLLOWING",
+          " RANGE BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING"]
+
+
+class GrammarGenerator:
+    """
+    Text-level query generator driven by a weighted grammar over the schema.
+
+    Every fragment that only depends on the schema (column references, predicates,
+    aggregates, join clauses, subqueries) is expanded once into pools at construction,
+    so generating a statement is a handful of random picks and string concatenations.
+    Window calls are the exception: there are refs² × (functions + frames × aggregates)
+    of them per table, so each one is drawn from its parts instead, with the same
+    distribution as a pool. No AST is ever built; mutation stays available for refinement.
+    """
+
+    def __init__(self, db_json: dict, rng: random.Random = None):
+        self.schema = db_json
+        self.rng = rng or random.Random()
+        self.index = SchemaIndex(db_json)
+        self.shapes = []
+        for name, weight in SHAPE_WEIGHTS.items():
+            self.shapes.extend([getattr(self, f"_{name}")] * weight)
+        self._build_pools()
+
+    def _build_pools(self):
+        index = self.index
+        self.refs = {}
+        self.predicates = {}
+        self.aggregates = {}
+        self.orderings = {}
+        self.joins = {}
+        self.subqueries = {}
+
+        for table in index.tables:
+            refs = [f"{table}.{col}" for col in index.column_names[table]]
+            self.refs[table] = refs
+
+            predicates = []
+            for col, typ in index.columns[table]:
+                ref = f"{table}.{col}"
+                literals = LITERALS.get(typ, LITERALS["INTEGER"])
+                for op in COMPARISONS:
+                    predicates.extend(f"{ref} {op} {lit}" for lit in literals)
+                predicates.append(f"{ref} IS NULL")
+                predicates.append(f"{ref} IS NOT NULL")
+                predicates.append(f"{ref} BETWEEN {literals[0]} AND {literals[-1]}")
+                predicates.append(f"{ref} IN ({', '.join(literals[:3])})")
+                if typ == "TEXT":
+                    predicates.append(f"{ref} LIKE 'a%'")
+                    predicates.append(f"{ref} GLOB '*o*'")
+                for other in refs:
+                    if other != ref:
+                        predicates.append(f"{ref} = {other}")
+            self.predicates[table] = predicates
+
+            self.aggregates[table] = [f"{agg}({ref})" for agg in AGGREGATES for ref in refs] + ["COUNT(*)"]
+            self.orderings[table] = [f"{ref} {d}" for ref in refs for d in ("ASC", "DESC")]
+
+            joins = []
+            for other in index.other_tables[table]:
+                for col1, col2 in index.join_pairs(table, other):
+                    for kind in ("JOIN", "LEFT JOIN"):
+                        joins.append((f" {kind} {other} ON {table}.{col1} = {other}.{col2}", other))
+                joins.append((f" CROSS JOIN {other}", other))
+            self.joins[table] = joins
+
+            subqueries = []
+            for other in index.other_tables[table]:
+                for col1, col2 in index.join_pairs(table, other):
+                    subqueries.append(f"{table}.{col1} IN (SELECT {other}.{col2} FROM {other})")
+                    subqueries.append(f"{table}.{col1} NOT IN (SELECT {other}.{col2} FROM {other} WHERE {other}.{col2} IS NOT NULL)")
+                    subqueries.append(f"EXISTS (SELECT 1 FROM {other} WHERE {other}.{col2} = {table}.{col1})")
+                    subqueries.append(f"{table}.{col1} = (SELECT MAX({other}.{col2}) FROM {other})")
+            self.subqueries[table] = subqueries or [f"EXISTS (SELECT 1 FROM {table})"]
+
+    def generate(self, count: int) -> List[str]:
+        """Generate `count` statements, each drawn from a weighted query shape."""
+        shapes = self.shapes
+        choice = self.rng.choice
+        return [choice(shapes)() for _ in range(count)]
+
+    # --- Fragments assembled at generation time ---
+
+    def _condition(self, tables):
+        choice = self.rng.choice
+        pred = choice(self.predicates[choice(tables)])
+        r = self.rng.random()
+        if r < 0.3:
+            pred = f"{pred} {choice(('AND', 'OR'))} {choice(self.predicates[choice(tables)])}"
+        elif r < 0.4:
+            pred = f"NOT ({pred})"
+        return pred
+
+    def _where(self, tables):
+        return f" WHERE {self._condition(tables)}" if self.rng.random() < 0.7 else ""
+
+    def _tail(self, tables):
+        tail = ""
+        if self.rng.random() < 0.3:
+            tail = f" ORDER BY {self.rng.choice(self.orderings[self.rng.choice(tables)])}"
+        if self.rng.random() < 0.25:
+            tail += f" LIMIT {self.rng.randint(0, 50)}"
+            if self.rng.random() < 0.3:
+                tail += f" OFFSET {self.rng.randint(0, 10)}"
+        return tail
+
+    def _window_call(self, table):
+        refs = self.refs[table]
+        choice = self.rng.choice
+        part, order = choice(refs), choice(refs)
+        spec = f"PARTITION BY {part} ORDER BY {order}"
+        pick = self.rng.randrange(len(WINDOW_FUNCTIONS) + len(FRAMES) * len(WINDOW_AGGREGATES))
+        if pick < len(WINDOW_FUNCTIONS):
+            return f"{WINDOW_FUNCTIONS[pick]} OVER ({spec})"
+        frame, agg = divmod(pick - len(WINDOW_FUNCTIONS), len(WINDOW_AGGREGATES))
+        return f"{WINDOW_AGGREGATES[agg]}({order}) OVER ({spec}{FRAMES[frame]})"
+
+    def _projection(self, tables):
+        refs = self.refs[self.rng.choice(tables)]
+        return ", ".join(self.rng.sample(refs, self.rng.randint(1, len(refs))))
+
+    # --- Query shapes ---
+
+    def _simple(self):
+        table = self.rng.choice(self.index.tables)
+        tables = (table,)
+        distinct = "DISTINCT " if self.rng.random() < 0.15 else ""
+        proj = "*" if self.rng.random() < 0.2 else self._projection(tables)
+        return f"SELECT {distinct}{proj} FROM {table}{self._where(tables)}{self._tail(tables)};"
+
+    def _join(self):
+        table = self.rng.choice(self.index.tables)
+        if not self.joins[table]:
+            return self._simple()
+        clause, other = self.rng.choice(self.joins[table])
+        tables = (table, other)
+        proj = f"{self._projection((table,))}, {self._projection((other,))}"
+        return f"SELECT {proj} FROM {table}{clause}{self._where(tables)}{self._tail(tables)};"
+
+    def _group(self):
+        table = self.rng.choice(self.index.tables)
+        tables = (table,)
+        key = self.rng.choice(self.refs[table])
+        agg = self.rng.choice(self.aggregates[table])
+        query = f"SELECT {key}, {agg} FROM {table}{self._where(tables)} GROUP BY {key}"
+        if self.rng.random() < 0.4:
+            query += f" HAVING {self.rng.choice(self.aggregates[table])} {self.rng.choice(COMPARISONS[:6])} {self.rng.choice(LITERALS['INTEGER'])}"
+        return f"{query}{self._tail(tables)};"
+
+    def _window(self):
+        table = self.rng.choice(self.index.tables)
+        tables = (table,)
+        return f"SELECT {self.rng.choice(self.refs[table])}, {self._window_call(table)} FROM {table}{self._where(tables)}{self._tail(tables)};"
+
+    def _subquery(self):
+        table = self.rng.choice(self.index.tables)
+        tables = (table,)
+        cond = self.rng.choice(self.subqueries[table])
+        if self.rng.random() < 0.5:
+            cond = f"{cond} {self.rng.choice(('AND', 'OR'))} {self._condition(tables)}"
+        return f"SELECT {self._projection(tables)} FROM {table} WHERE {cond}{self._tail(tables)};"
@@ -0,0 +1,240 @@
+"""
+Persistent in-process execution of an instrumented libsqlite3.
+
+A worker process loads the shared library through ctypes, opens the database once and
+then runs every query with sqlite3_exec on that connection, resetting the gcov counters
+before each query and dumping them right after it. This saves the sqlite3 shell start-up,
+the database open and the full process teardown of every run. The library must export the
+gcov wrappers of gcov_shim.c, which is appended to sqlite3.c before building it:
+
+    cat gcov_shim.c >> sqlite3.c
+    gcc -c -fPIC --coverage sqlite3.c && gcc -shared --coverage -o libsqlite3.so sqlite3.o
+
+The parent keeps one worker per backend. When the worker dies (segfault, abort, or killed
+after a timeout) the query is reported like the shell would report it, and a fresh worker
+is spawned right away for the next query.
+
+    python inprocess.py <libsqlite3.so> <database>    (worker side, spoken to over stdin/stdout)
+"""
+import asyncio
+import ctypes
+import os
+import re
+import struct
+import subprocess
+import sys
+
+from scripts import LocalBackend, parse_coverage, parse_line_coverage, run_async, TEMP_DB_PATH
+
+# Frame header of the worker protocol: payload length
+FRAME = struct.Struct("<I")
+# Reply header: stdout length, stderr length
+REPLY = struct.Struct("<II")
+
+SQLITE_OPEN_READWRITE = 0x2
+SQLITE_OPEN_CREATE = 0x4
+
+PROGRESS = re.compile(r"\.progress (\d+) --limit (\d+)[^\n]*\n?")
+
+ROW_CALLBACK = ctypes.CFUNCTYPE(
+    ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.POINTER(ctypes.c_char_p), ctypes.POINTER(ctypes.c_char_p)
+)
+PROGRESS_CALLBACK = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p)
+
+
+# --- Worker side ---
+
+def _read_exactly(stream, size):
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError
+    return data
+
+
+def serve(lib_path, db_path):
+    lib = ctypes.CDLL(lib_path)
+    lib.sqlite3_open_v2.argtypes = [ctypes.c_char_p, ctypes.POINTER(ctypes.c_void_p), ctypes.c_int, ctypes.c_char_p]
+    lib.sqlite3_exec.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ROW_CALLBACK, ctypes.c_void_p, ctypes.POINTER(ctypes.c_void_p)]
+    lib.sqlite3_progress_handler.argtypes = [ctypes.c_void_p, ctypes.c_int, PROGRESS_CALLBACK, ctypes.c_void_p]
+    lib.sqlite3_free.argtypes = [ctypes.c_void_p]
+    # libgcov's own entry points are hidden in a shared library: go through gcov_shim.c
+    try:
+        gcov_reset = lib.sqlite3_fuzz_gcov_reset
+        gcov_dump = lib.sqlite3_fuzz_gcov_dump
+    except AttributeError:
+        print(f"Error: {lib_path} does not export the gcov wrappers of gcov_shim.c", file=sys.stderr)
+        return 1
+
+    db = ctypes.c_void_p()
+    if lib.sqlite3_open_v2(db_path.encode(), ctypes.byref(db), SQLITE_OPEN_READWRITE | SQLITE_OPEN_CREATE, None):
+        print(f"Error: cannot open {db_path}", file=sys.stderr)
+        return 1
+
+    rows = []
+    progress = [0, 0]
+
+    @ROW_CALLBACK
+    def on_row(_, n, values, names):
+        # Same layout as the sqlite3 shell's default list mode
+        rows.append(b"|".join(values[i] or b"" for i in range(n)))
+        return 0
+
+    @PROGRESS_CALLBACK
+    def on_progress(_):
+        progress[0] += 1
+        if progress[0] >= progress[1]:
+            rows.append(f"Progress limit reached ({progress[0]})".encode())
+            return 1
+        return 0
+
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    # Handshake: the parent waits for this empty reply before sending queries
+    stdout.write(REPLY.pack(0, 0))
+    stdout.flush()
+    gcov_reset()
+
+    while True:
+        try:
+            (size,) = FRAME.unpack(_read_exactly(stdin, FRAME.size))
+            sql = _read_exactly(stdin, size).decode()
+        except EOFError:
+            return 0
+
+        # The shell's `.progress` prelude (see scripts.with_progress_limit) maps onto the progress handler
+        match = PROGRESS.match(sql)
+        if match:
+            sql = sql[match.end():]
+            progress[:] = [0, int(match.group(2))]
+            lib.sqlite3_progress_handler(db, int(match.group(1)), on_progress, None)
+
+        rows.clear()
+        errmsg = ctypes.c_void_p()
+        rc = lib.sqlite3_exec(db, sql.encode(), on_row, None, ctypes.byref(errmsg))
+        error = b""
+        if rc:
+            error = b"Error: " + (ctypes.string_at(errmsg) if errmsg.value else f"code {rc}".encode())
+            lib.sqlite3_free(errmsg)
+        if match:
+            # A NULL callback removes the handler
+            lib.sqlite3_progress_handler(db, 0, PROGRESS_CALLBACK(), None)
+
+        # Dumping merges this query's counters into the .gcda files; reset so the next dump adds only its own
+        gcov_dump()
+        gcov_reset()
+
+        output = b"\n".join(rows)
+        stdout.write(REPLY.pack(len(output), len(error)) + output + error)
+        stdout.flush()
+
+
+# --- Parent side ---
+
+class Worker:
+    """Handle on one worker process serving queries over its pipes."""
+
+    def __init__(self, lib_path, db_path, cwd=None):
+        self.lib_path = lib_path
+        self.db_path = db_path
+        self.cwd = cwd
+        self.proc = None
+        self.spawns = 0
+        # One query at a time: concurrent callers would interleave frames and read each other's replies
+        self.lock = asyncio.Lock()
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), self.lib_path, self.db_path,
+            cwd=self.cwd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE
+        )
+        self.spawns += 1
+        try:
+            await self.proc.stdout.readexactly(REPLY.size)
+        except asyncio.IncompleteReadError:
+            # The worker reported why on stderr; without coverage every result would be wrong
+            raise RuntimeError(f"In-process worker over {self.lib_path} failed to start") from None
+
+    async def _roundtrip(self, data):
+        self.proc.stdin.write(FRAME.pack(len(data)) + data)
+        await self.proc.stdin.drain()
+        out_size, err_size = REPLY.unpack(await self.proc.stdout.readexactly(REPLY.size))
+        body = await self.proc.stdout.readexactly(out_size + err_size)
+        return body[:out_size], body[out_size:]
+
+    async def execute(self, query, timeout=None):
+        """
+        Run `query` and return (returncode, stdout, stderr). The return code is 0 while the
+        worker survives, its negative signal number if it died, or None after a timeout.
+        """
+        async with self.lock:
+            return await self._execute(query, timeout)
+
+    async def _execute(self, query, timeout):
+        if self.proc is None or self.proc.returncode is not None:
+            await self.start()
+        try:
+            stdout, stderr = await asyncio.wait_for(self._roundtrip(query.encode()), timeout)
+            return 0, stdout, stderr
+        except asyncio.TimeoutError:
+            self.proc.kill()
+            await self.proc.wait()
+            returncode = None
+        except (asyncio.IncompleteReadError, BrokenPipeError, ConnectionResetError):
+            returncode = await self.proc.wait()
+        # Respawn right away, so the next query does not pay for the start-up
+        await self.start()
+        if returncode is not None and returncode >= 0:
+            return returncode, b"", f"Error: worker exited with status {returncode}".encode()
+        return returncode, b"", b""
+
+
+class InProcessBackend(LocalBackend):
+    """
+    Local backend whose instrumented runs (those of `sqlite_dir`) go to a persistent
+    ctypes worker over `lib_path`. Reference runs still use the binaries through
+    subprocess pipes. Coverage is read from the library's `gcda` file in `sqlite_dir`.
+    """
+
+    def __init__(self, lib_path, sqlite_dir, gcda="sqlite3.gcda"):
+        self.lib_path = os.path.abspath(lib_path)
+        self.sqlite_dir = sqlite_dir
+        self.gcda = gcda
+        self.worker = None
+
+    def _worker(self, db_path):
+        db_path = os.path.abspath(db_path)
+        if self.worker is None or self.worker.db_path != db_path:
+            self.worker = Worker(self.lib_path, db_path, cwd=self.sqlite_dir)
+        return self.worker
+
+    async def run_query_async(self, sqlite_dir, sqlite_binary, query, db_path=TEMP_DB_PATH, timeout=None):
+        if sqlite_dir != self.sqlite_dir:
+            return await super().run_query_async(sqlite_dir, sqlite_binary, query, db_path=db_path, timeout=timeout)
+        returncode, stdout, stderr = await self._worker(db_path).execute(query, timeout)
+        return stdout.strip(), self._stderr(returncode, stderr)
+
+    async def digest_query_async(self, sqlite_dir, sqlite_binary, query, digest, db_path=TEMP_DB_PATH, timeout=None):
+        if sqlite_dir != self.sqlite_dir:
+            return await super().digest_query_async(sqlite_dir, sqlite_binary, query, digest, db_path=db_path, timeout=timeout)
+        returncode, stdout, stderr = await self._worker(db_path).execute(query, timeout)
+        digest.feed(stdout)
+        return digest.finish(), self._stderr(returncode, stderr)
+
+    def collect_coverage(self, sqlite_dir):
+        result = subprocess.run(["gcov", self.gcda], cwd=sqlite_dir, check=True, capture_output=True, text=True)
+        return parse_coverage(result.stdout)
+
+    async def collect_coverage_async(self, sqlite_dir):
+        returncode, stdout, stderr = await run_async(["gcov", self.gcda], cwd=sqlite_dir)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, "gcov", stdout, stderr)
+        return parse_coverage(stdout.decode())
+
+    async def collect_line_coverage_async(self, sqlite_dir):
+        returncode, stdout, stderr = await run_async(["gcov", "--stdout", self.gcda], cwd=sqlite_dir)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, "gcov", stdout, stderr)
+        return parse_line_coverage(stdout)
+
+
+if __name__ == "__main__":
+    sys.exit(serve(sys.argv[1], sys.argv[2]))
@@ -1,28 +1,97 @@
-import sys
-from collections import deque
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import time
+from collections import deque, namedtuple
 from src.queue_entry import QueueEntry
-from scripts import (
-    setup_db,
-    clear_coverage,
-    run_query,
-    collect_coverage,
-    export_query_to_local,
-)
+from scripts import setup_db, make_backend, with_progress_limit, TEMP_DB_PATH, TIMEOUT_MARKER, PROGRESS_MARKER
 from src.generator import Generator
+from src.grammar import GrammarGenerator
+from src.oracle import build_oracle_script, check_oracles
+from src.replay import ReplayLog, derive_seed, ENGINE_GRAMMAR, ENGINE_MUTATION, ENGINE_SPLICE
+from src.metrics import Metrics
+from src.findings import FindingsWriter, db_snapshot_id
+from src.digest import OutputDigest, has_order_by
+from src.crashes import CrashTriage, crashed
+from src.validator import SchemaValidator
+from src.scheduler import OperatorScheduler
+from src.plan_feedback import PlanFeedback, explain_script
+from src.coverage_policy import CoveragePolicy, SIGNALS
+from src.coverage_map import CoverageMap
 
 
 MAX_MUTATIONS = 2
 MUTATION_ATTEMPTS = 3
+# Share of rounds that draw fresh queries from the grammar instead of mutating the parent
+GRAMMAR_RATIO = 0.25
+# Share of rounds that splice the parent with another queue entry (see Generator.splice)
+SPLICE_RATIO = 0.15
+# "diff" compares against new_sqlite_binary, "metamorphic" checks TLP/NoREC invariants on sqlite_binary only
+ORACLE_MODE = "diff"
+# Print every query, its stderr and coverage; terminal output is slow enough to bound throughput
+VERBOSE = False
+# Save both outputs, stderr and coverage next to each finding
+SAVE_FINDING_DETAILS = True
+# Mutants buffered between pipeline stages (generate -> execute -> triage)
+PIPELINE_DEPTH = 8
+# Wall-clock seconds after which a run is killed and reported as a hang
+QUERY_TIMEOUT = 5.0
+# Progress callbacks (of 1000 VM instructions) before the shell interrupts a statement, None to disable
+PROGRESS_LIMIT = None
+# Compile mutants on an in-memory replica of the schema and drop those that cannot run
+VALIDATE_MUTANTS = True
+# "gcov" admits mutants on line coverage gains, "plan" on new query plans or VDBE opcode pairs
+# (see src/plan_feedback.py)
+FEEDBACK = "gcov"
+# Cheap tier a run must pass to be measured by gcov: "always", "status", "digest" or "plan"
+# (see src/coverage_policy.py), and the share of the other runs measured anyway. Plan feedback
+# admits mutants without gcov, so from the command line it implies the "plan" tier
+COVERAGE_SIGNAL = "status"
+COVERAGE_SAMPLE_RATE = 0.05
+# Shared memory segment of the global coverage map (see src/coverage_map.py); processes
+# started with the same master seed share one unless a name is given
+COVERAGE_MAP_NAME = None
+COVERAGE_MAP_SNAPSHOT = "bugs/coverage_map.bin"
+# Queries slower than this are tracked, and as seeds get a single round of mutations
+SLOW_QUERY_SECONDS = 1.0
 
+# "docker" runs everything in server_container, "local" runs the binaries below on this machine,
+# "inprocess" also runs locally but sends instrumented queries to a persistent worker over sqlite_lib
+BACKEND = "docker"
 server_container = "sqlite3"
 
 sqlite_dir = "/home/test/sqlite"
 sqlite_binary = "sqlite3"
+# Instrumented shared library of the same build, for the inprocess backend
+sqlite_lib = "/home/test/sqlite/.libs/libsqlite3.so"
 
 new_sqlite_dir = "/usr/bin"
 new_sqlite_binary = "sqlite3-3.39.4"
 
+# Sanitizer (or debug) build whose stderr carries a stack trace, used to bucket crashes.
+# None reruns crashes on the instrumented binary and exports every distinct crashing query.
+symbolized_dir = None
+symbolized_binary = "sqlite3-asan"
+
+# Database file seen by the backend; each schema shard gets its own
+db_path = TEMP_DB_PATH
+backend = None
+# PlanFeedback, when plans are explained (plan feedback or plan coverage signal)
+feedback = None
+coverage_policy = None
+coverage_map = None
+
 queue = deque()
+# One mutant flowing through the pipeline; `last` closes its parent's iteration
+Job = namedtuple("Job", "iteration entry index engine parsed seed sql ast cases operators donor donor_parsed last")
+metrics = Metrics(json_path="bugs/metrics.json", prom_path="bugs/metrics.prom")
+
+
+def log(*args):
+    if VERBOSE:
+        print(*args)
 
 def seed_initial_queries():
     return [
@@ -30,110 +99,477 @@ def seed_initial_queries():
     ]
 
 
-def run_with_coverage(query):
-    print(f"Running query: {query}")
-    stdout, stderr = run_query(server_container, sqlite_dir, sqlite_binary, query)
-    print(f"\n{stderr}\n")
+def shard_path(path, shard):
+    """Per-shard variant of an output path, so shards running side by side keep their own files."""
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-shard{shard}{ext}"
+
+
+async def timed(phase, coro):
+    with metrics.time(phase):
+        return await coro
 
-    coverage = collect_coverage(server_container)
-    print(f"Generating coverage... {coverage}")
-    print(coverage)
 
-    print("\n\nChecking results on new version...")
-    stdout_new, stderr_new = run_query(server_container, new_sqlite_dir, new_sqlite_binary, query)
-    # write_results(stdout_new.decode(), stderr_new.decode(), stdout.decode(), stderr.decode())
+async def run_with_coverage(query, cases=None, crashes=None):
+    log(f"Running query: {query}")
+    metrics.incr("execs")
+    metamorphic = ORACLE_MODE == "metamorphic"
+    script = reference_script = query
+    if metamorphic:
+        # Mutant and derived oracle queries run as one script on a single binary
+        script = build_oracle_script(query, cases or [])
+    if PROGRESS_LIMIT:
+        script = with_progress_limit(script, PROGRESS_LIMIT)
+        reference_script = with_progress_limit(reference_script, PROGRESS_LIMIT)
+    # Without ORDER BY, both binaries may return the same rows in a different order
+    ordered = has_order_by(query)
+
+    reference = None
+    if not metamorphic:
+        # The reference binary leaves the .gcda files alone, so it runs alongside the instrumented one and gcov
+        reference = asyncio.create_task(timed("run.reference", backend.digest_query_async(
+            new_sqlite_dir, new_sqlite_binary, reference_script, OutputDigest(ordered, PROGRESS_MARKER.encode(), SAVE_FINDING_DETAILS),
+            db_path=db_path, timeout=QUERY_TIMEOUT)))
+
+    start = time.perf_counter()
+    with metrics.time("run.instrumented"):
+        if metamorphic:
+            # The oracle check needs the full output of every derived query
+            stdout, stderr = await backend.run_query_async(sqlite_dir, sqlite_binary, script, db_path=db_path, timeout=QUERY_TIMEOUT)
+        else:
+            output, stderr = await backend.digest_query_async(
+                sqlite_dir, sqlite_binary, script, OutputDigest(ordered, PROGRESS_MARKER.encode(), SAVE_FINDING_DETAILS),
+                db_path=db_path, timeout=QUERY_TIMEOUT)
+    seconds = time.perf_counter() - start
+    error = stderr.decode(errors="replace")
+    log(f"\n{error}\n")
+
+    # Confirm a crash before anything else runs: the reruns stay within this mutant's coverage
+    # window, and the instrumented build (or inprocess worker) keeps serving one query at a time
+    verdict = None
+    if crashes is not None and crashed(stderr):
+        with metrics.time("crash_triage"):
+            # A derived oracle query may be the one crashing
+            verdict = await crashes.triage(build_oracle_script(query, cases) if cases else query)
+
+    # First tier: the run's own exit status, then its plan or output novelty
+    clean = not error and not (PROGRESS_MARKER.encode() in stdout if metamorphic else output.seen)
+    novel = False
+    if clean and feedback is not None:
+        # On the reference binary: EXPLAIN on the instrumented one would land in the .gcda counters
+        with metrics.time("explain"):
+            plan, _ = await backend.run_query_async(new_sqlite_dir, new_sqlite_binary, explain_script(query), db_path=db_path, timeout=QUERY_TIMEOUT)
+        novel = feedback.observe(plan) > 0
+        metrics.gauge("plan_features", len(feedback.seen))
+    signal_novel = novel
+    if coverage_policy.signal == "digest":
+        key = hash(stdout) if metamorphic else (output.ordered, output.lines, output.hexdigest())
+        signal_novel = coverage_policy.digest_novel(key)
+
+    # Coverage is cumulative over the .gcda files: collect it before the next instrumented run
+    new_lines = 0
+    if coverage_policy.should_measure(clean, signal_novel):
+        with metrics.time("coverage"):
+            coverage, lines = await backend.collect_line_coverage_async(sqlite_dir)
+            new_lines = coverage_map.merge(lines)
+        coverage_policy.coverage = coverage
+        metrics.incr("coverage_runs")
+        metrics.gauge("coverage_sampled", coverage_policy.sampled)
+        metrics.gauge("coverage_map_lines", coverage_map.covered)
+    else:
+        coverage = coverage_policy.coverage
+        metrics.incr("coverage_skipped")
+    log(f"Coverage: {coverage} (+{new_lines} lines)")
+
+    output_new = stderr_new = None
+    if reference is not None:
+        output_new, stderr_new = await reference
+
+    if metamorphic:
+        interrupted = PROGRESS_MARKER.encode() in stdout
+    else:
+        interrupted = output.seen or output_new.seen
+    timed_out = TIMEOUT_MARKER in error or (stderr_new is not None and TIMEOUT_MARKER.encode() in stderr_new)
 
     is_logical = False
     is_crash = False
     syntax_err = False
-    if ("Segmentation fault" in stderr.decode()):
-        print("> Error detected!")
-        is_crash = True
-    elif (stderr.decode()):
-        print("> Syntax error detected!")
-        syntax_err = True
-    elif (stdout_new.decode() == stdout.decode()):
-        print("> Outputs are the same.")
+    is_hang = False
+    with metrics.time("compare"):
+        if crashed(stderr):
+            log("> Error detected!")
+            is_crash = True
+        elif timed_out or interrupted:
+            log("> Query timed out!")
+            is_hang = True
+        elif (error):
+            log("> Syntax error detected!")
+            syntax_err = True
+        elif metamorphic:
+            failed = check_oracles(cases, stdout.decode()) if cases else []
+            if failed:
+                log(f"> Oracle invariants violated: {', '.join(failed)}! Check logs.")
+                is_logical = True
+            else:
+                log("> Oracle invariants hold.")
+        elif (output_new == output):
+            log("> Outputs are the same.")
+        else:
+            log("> Outputs are different! Check logs.")
+            is_logical = True
+    if seconds >= SLOW_QUERY_SECONDS and not is_hang:
+        metrics.incr("slow_queries")
+
+    outputs = {"stderr": stderr, "stderr_reference": stderr_new, "seconds": seconds}
+    if metamorphic:
+        outputs["stdout"] = stdout
     else:
-        print("> Outputs are different! Check logs.")
-        is_logical = True
-    return coverage, is_logical, is_crash, syntax_err
+        outputs["stdout_digest"] = output.hexdigest()
+        outputs["stdout_reference_digest"] = output_new.hexdigest()
+        if is_logical and SAVE_FINDING_DETAILS:
+            # Only mismatches keep the outputs themselves, as they were digested
+            outputs["stdout"] = output.output()
+            outputs["stdout_reference"] = output_new.output()
+        output.discard()
+        output_new.discard()
+    return coverage, new_lines, novel, is_logical, is_crash, verdict, syntax_err, is_hang, outputs
 
-def initialize_queue():
+async def initialize_queue(entry_ids):
     """
     Initialize the queue with initial queries and their coverage.
     """
     initial_queries = seed_initial_queries()
     for q in initial_queries:
-        print(f"Running initial query: {q}")
-        coverage, _, _, _ = run_with_coverage(q)
-        entry = QueueEntry(sql=q, cov=coverage)
+        log(f"Running initial query: {q}")
+        coverage, _, _, _, _, _, _, _, outputs = await run_with_coverage(q)
+        entry = QueueEntry(sql=q, entry_id=next(entry_ids), exec_time=outputs["seconds"])
         queue.append(entry)
-        print(f"Initial query coverage: {coverage}")
+        log(f"Initial query coverage: {coverage}")
 
 
-def main_loop():
-    clear_coverage(server_container, sqlite_dir)
-    print("Setting up database...")
-    db = setup_db(server_container, sqlite_dir, sqlite_binary)
-    gen = Generator(db)
-    initialize_queue()
-    queries_count = 0
-    syntax_errors = 0
-    bugs_found = 0
-    crashes_found = 0
-
-    while queue:
-        entry = queue.popleft()
-
-        if entry.mutation_count >= MAX_MUTATIONS:
-            if not entry.has_new_coverage():
+async def fuzz(gen, grammar, campaign_rng, entry_ids, replay_log, findings, crashes, scheduler, validator=None):
+    """
+    Pipelined campaign loop: generate -> instrumented || reference -> coverage -> triage.
+
+    Stages are coroutines connected by queues of PIPELINE_DEPTH mutants: the next mutants
+    are generated while queries execute, and a slow stage backpressures the ones before it.
+    Triage handles mutants in generation order, so findings and the replay log are numbered
+    exactly as in a sequential run. Crashes go through `crashes` (a CrashTriage) on the
+    execute stage: only reproducible ones are exported, as one crash{i}.sql per stack signature. With a
+    `validator`, mutants that do not compile on the schema never reach execution; the
+    others keep their index, so the replay log still locates them among the regenerated ones.
+    A parent whose mutants were all rejected stays queued for another round.
+    The outcome of every mutation-engine mutant feeds `scheduler`, whose updated stage
+    probabilities take effect at the next iteration and are logged for replay.
+    Returns the campaign totals.
+    """
+    jobs = asyncio.Queue(PIPELINE_DEPTH)
+    results = asyncio.Queue(PIPELINE_DEPTH)
+    # Parents whose iteration is not triaged yet; while any is pending, they may still refill the queue
+    pending = 0
+    refilled = asyncio.Event()
+    totals = {"queries": 0, "syntax_errors": 0, "bugs": 0, "crashes": 0, "hangs": 0, "iterations": 0}
+
+    def gain(new_lines, novel):
+        # What admission (and an entry's next round of mutations) is based on
+        if FEEDBACK == "plan":
+            return int(novel)
+        return new_lines
+
+    def finish_iteration(entry, new_lines=0, novel=False, rejected=False):
+        nonlocal pending
+        replay_log.flush()
+        coverage_map.maybe_snapshot()
+        totals["iterations"] += 1
+        if rejected:
+            # The validator rejected every mutant, so nothing ran: the round does not count
+            # against the parent, or a few unlucky rounds would retire it and empty the queue
+            queue.append(entry)
+        else:
+            entry.mutation_count += 1
+            found = gain(new_lines, novel)
+            entry.update_coverage(found)
+            if found > 0:
+                queue.append(entry)  # requeue the parent for future mutations
+            else:
+                entry.release()
+        pending -= 1
+        refilled.set()
+
+        metrics.gauge("queue", len(queue))
+        metrics.gauge("iterations", totals["iterations"])
+        metrics.gauge("ast_cache_chars", QueueEntry.cache.size)
+        metrics.gauge("ast_cache_evictions", QueueEntry.cache.evictions)
+        metrics.maybe_report()
+
+    async def generate():
+        nonlocal pending
+        iteration = 0
+        while queue or pending:
+            if not queue:
+                refilled.clear()
+                await refilled.wait()
                 continue
+            entry = queue.popleft()
+
+            # Expensive seeds slow down every mutant derived from them: mutate them only once
+            max_mutations = 1 if entry.exec_time >= SLOW_QUERY_SECONDS else MAX_MUTATIONS
+            if entry.mutation_count >= max_mutations:
+                if not entry.has_new_coverage():
+                    entry.release()
+                    continue
+
+                # Coverage increased, reset mutation count for additional mutations
+                entry.reset_mutation_count()
+
+            if scheduler.due():
+                gen.probs = scheduler.update()
+                replay_log.record_schedule(iteration, gen.probs)
+                for op, prob in gen.probs.items():
+                    metrics.gauge(f"operator_prob_{op}", round(prob, 3))
+
+            # Each iteration reseeds the engine, so its seed alone regenerates the mutants
+            iteration_seed = campaign_rng.getrandbits(64)
+            parsed = not entry.ast_cached
+            donor = None
+            donor_parsed = False
+            with metrics.time("mutate"):
+                draw = campaign_rng.random()
+                if draw < GRAMMAR_RATIO:
+                    engine = ENGINE_GRAMMAR
+                    grammar.rng.seed(iteration_seed)
+                    mutated_queries = [(q, None) for q in grammar.generate(MUTATION_ATTEMPTS)]
+                    operators = [()] * len(mutated_queries)
+                elif draw < GRAMMAR_RATIO + SPLICE_RATIO and queue:
+                    engine = ENGINE_SPLICE
+                    donor = queue[campaign_rng.randrange(len(queue))]
+                    donor_parsed = not donor.ast_cached
+                    gen.rng.seed(iteration_seed)
+                    mutated_queries = gen.splice_entries(entry, donor, MUTATION_ATTEMPTS)
+                    operators = gen.applied
+                    metrics.incr("spliced", len(mutated_queries))
+                else:
+                    engine = ENGINE_MUTATION
+                    gen.rng.seed(iteration_seed)
+                    mutated_queries = gen.mutate_entry(entry, MUTATION_ATTEMPTS)
+                    operators = gen.applied
+
+            mutants = list(enumerate(mutated_queries))
+            if validator is not None:
+                valid = []
+                with metrics.time("validate"):
+                    for index, mutant in mutants:
+                        if validator.is_valid(mutant[0]):
+                            valid.append((index, mutant))
+                        elif engine == ENGINE_MUTATION:
+                            # A rejected mutant is a syntax error the stages did not have to pay for
+                            scheduler.reward(operators[index], syntax_error=True)
+                if len(valid) < len(mutants):
+                    metrics.incr("invalid_mutants", len(mutants) - len(valid))
+                mutants = valid
 
-            # Coverage increased, reset mutation count for additional mutations
-            entry.reset_mutation_count()
+            pending += 1
+            if not mutants:
+                finish_iteration(entry, rejected=True)
+            for position, (index, (new_sql, new_ast)) in enumerate(mutants):
+                cases = gen.metamorphic_queries(new_sql, new_ast) if ORACLE_MODE == "metamorphic" else None
+                await jobs.put(Job(iteration, entry, index, engine, parsed, iteration_seed, new_sql, new_ast,
+                                   cases, operators[index], donor, donor_parsed, position == len(mutants) - 1))
+            iteration += 1
+            # Let the execution stage pick up the mutants before generating more
+            await asyncio.sleep(0)
+        await jobs.put(None)
 
-        mutated_queries = gen.mutate_query(entry.sql, MUTATION_ATTEMPTS)
+    async def execute():
+        while True:
+            job = await jobs.get()
+            if job is None:
+                await results.put(None)
+                return
+            await results.put((job, await run_with_coverage(job.sql, job.cases, crashes)))
 
-        for new_sql in mutated_queries:
-            coverage, bug, crash, err = run_with_coverage(new_sql)
-            
+    async def triage():
+        # Lines added to the coverage map by the iteration being triaged, and whether one of
+        # its mutants had a new plan (plan feedback)
+        iteration_lines = 0
+        iteration_novel = False
+        while True:
+            item = await results.get()
+            if item is None:
+                return
+            job, (coverage, new_lines, novel, bug, crash, verdict, err, hang, outputs) = item
+            entry = job.entry
+            iteration_lines += new_lines
+            iteration_novel = iteration_novel or novel
+
+            # Metamorphic findings only reproduce together with their oracle queries
+            finding_sql = build_oracle_script(job.sql, job.cases) if job.cases else job.sql
+            admitted = True
             if err:
-                syntax_errors += 1
+                totals["syntax_errors"] += 1
+                metrics.incr("syntax_errors")
             elif bug:
-                export_query_to_local(new_sql, server_container, bugs_found, 'logical')
-                bugs_found += 1
+                with metrics.time("export"):
+                    findings.record('logical', totals["bugs"], finding_sql, coverage=coverage, **outputs)
+                totals["bugs"] += 1
+                metrics.incr("bugs")
             elif crash:
-                export_query_to_local(new_sql, server_container, crashes_found, 'crash')
-                crashes_found += 1
-            elif coverage - entry.new_coverage > 0.05:
-                print(f"New coverage: {coverage} (previous: {entry.new_coverage})")
+                totals["crashes"] += 1
+                metrics.incr("crashes")
+                if verdict is None:
+                    log("> Crash did not reproduce.")
+                    metrics.incr("crashes_flaky")
+                    admitted = False
+                else:
+                    bucket, new, representative = verdict
+                    if representative:
+                        # A smaller or faster reproducer of a known bucket overwrites its files
+                        with metrics.time("export"):
+                            findings.record('crash', bucket.index, finding_sql, coverage=coverage, signature=bucket.signature,
+                                            frames=bucket.frames, hits=bucket.hits, **outputs)
+                    metrics.gauge("crash_buckets", len(crashes.buckets))
+                    if not new:
+                        metrics.incr("crashes_duplicate")
+                    # Mutants of a known crash mostly hit it again
+                    admitted = new
+            elif hang:
+                with metrics.time("export"):
+                    findings.record('hang', totals["hangs"], finding_sql, coverage=coverage, **outputs)
+                totals["hangs"] += 1
+                metrics.incr("hangs")
+                # A seed that times out would stall all of its mutants
+                admitted = False
+            elif gain(new_lines, novel) > 0:
+                log(f"New coverage: {coverage} (+{new_lines} lines, new plan: {novel})")
             else:
-                continue
+                admitted = False
+
+            if job.engine == ENGINE_MUTATION:
+                scheduler.reward(job.operators, win=admitted and not err, syntax_error=err)
+
+            child_id = None
+            if admitted:
+                new_entry = QueueEntry(
+                    sql=job.sql,
+                    ast=job.ast,
+                    entry_id=next(entry_ids),
+                    exec_time=outputs["seconds"]
+                )
+                child_id = new_entry.id
+                queue.append(new_entry)
+                totals["queries"] += 1
+                metrics.incr("admitted")
+                if job.engine == ENGINE_SPLICE:
+                    metrics.incr("splice_admitted")
+            replay_log.record(job.iteration, entry.id, child_id, job.index, job.engine, job.parsed, job.seed, job.sql,
+                              donor_id=job.donor.id if job.donor else None, donor_parsed=job.donor_parsed)
+            if job.last:
+                finish_iteration(entry, iteration_lines, iteration_novel)
+                iteration_lines = 0
+                iteration_novel = False
+
+    await initialize_queue(entry_ids)
+    await asyncio.gather(generate(), execute(), triage())
+    return totals
 
-            new_entry = QueueEntry(
-                sql=new_sql,
-                cov=coverage
-            )
-            queue.append(new_entry)
-            queries_count += 1
 
-        entry.mutation_count += 1
-        entry.update_coverage(coverage)
-        if coverage - entry.new_coverage > 0.05:
-            queue.append(entry)  # requeue the parent for future mutations
-        
+def main_loop(shard=None, seed=None, log_path=None, backend_name=BACKEND, resume_coverage=None):
+    """
+    Run a fuzzing campaign. With a `shard` number, the campaign fuzzes its own
+    randomized schema (see scripts.create_random_db) instead of the fixed one.
+
+    All randomness derives from the master `seed`, and every mutant is recorded in
+    the replay log at `log_path` (see src/replay.py to regenerate one). Output files
+    default to per-shard paths (bugs/campaign-shard{n}.log, findings under bugs/shard{n}).
 
-        print(f"Queue size: {len(queue)}")
-        print(f"Queries executed: {queries_count}")
-        print(f"Syntax errors: {syntax_errors}")
-        print(f"Bugs found: {bugs_found}")
-        print(f"Crashes found: {crashes_found}")
+    `backend_name` selects where the sqlite3 binaries run (see scripts.make_backend).
+    Processes started with the same `seed` share one coverage map; `resume_coverage` is
+    a snapshot of it (see src/coverage_map.py) to start from.
+    """
+    global db_path, backend, feedback, coverage_policy, coverage_map
+    log_path = log_path or shard_path("bugs/campaign.log", shard)
+    metrics.json_path = shard_path(metrics.json_path, shard)
+    metrics.prom_path = shard_path(metrics.prom_path, shard)
+    backend = make_backend(backend_name, server_container, lib_path=sqlite_lib, sqlite_dir=sqlite_dir)
+    feedback = PlanFeedback() if "plan" in (FEEDBACK, COVERAGE_SIGNAL) else None
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(63)
+    print(f"Master seed: {seed}")
+    campaign_rng = random.Random(derive_seed(seed, "campaign", shard))
+    coverage_policy = CoveragePolicy(COVERAGE_SIGNAL, COVERAGE_SAMPLE_RATE, rng=random.Random(derive_seed(seed, "coverage")))
 
+    backend.clear_coverage(sqlite_dir)
+    print("Setting up database...")
+    local_path = shard_path("bugs/test.db", shard)
+    if backend_name != "docker":
+        # The binaries read the locally built file in place
+        db_path = local_path
+    elif shard is not None:
+        db_path = TEMP_DB_PATH.replace(".db", f"-shard{shard}.db")
+    if shard is None:
+        db = setup_db(backend, sqlite_dir, sqlite_binary, db_path=db_path, local_path=local_path,
+                      rng=random.Random(derive_seed(seed, "db")))
+    else:
+        db = setup_db(backend, sqlite_dir, sqlite_binary, db_path=db_path, local_path=local_path, shard=shard)
+    findings_dir = "bugs" if shard is None else f"bugs/shard{shard}"
+    findings = FindingsWriter(findings_dir, details=SAVE_FINDING_DETAILS, snapshot_id=db_snapshot_id(local_path))
+    gen = Generator(db, rng=random.Random())
+    grammar = GrammarGenerator(db, rng=random.Random())
+    replay_log = ReplayLog(log_path, seed, shard, MUTATION_ATTEMPTS, seed_initial_queries())
+    symbolized = (symbolized_dir, symbolized_binary) if symbolized_dir else (sqlite_dir, sqlite_binary)
+    crashes = CrashTriage(backend, symbolized, db_path, timeout=QUERY_TIMEOUT)
+    validator = SchemaValidator(db) if VALIDATE_MUTANTS else None
+    scheduler = OperatorScheduler(rng=random.Random(derive_seed(seed, "scheduler")))
+    coverage_map = CoverageMap(COVERAGE_MAP_NAME or f"sqlfuzz_{seed:x}", snapshot_path=COVERAGE_MAP_SNAPSHOT)
+    if resume_coverage:
+        print(f"Resumed coverage map: {coverage_map.load(resume_coverage)} lines")
+    try:
+        totals = asyncio.run(fuzz(gen, grammar, campaign_rng, itertools.count(), replay_log, findings, crashes,
+                                  scheduler, validator))
+    finally:
+        # The shared segment outlives the process unless its creator unlinks it
+        coverage_map.snapshot()
+        coverage_map.close()
 
-    print(f"Total queries executed: {queries_count}")
-    print(f"Total bugs found: {bugs_found}")
+    replay_log.close()
+    findings.close()
+    crashes.save(shard_path("bugs/crash_buckets.json", shard))
+    scheduler.save(shard_path("bugs/operators.json", shard))
+    metrics.report()
+    print(f"Total queries executed: {totals['queries']}")
+    print(f"Total bugs found: {totals['bugs']}")
+    print(f"Total crashes: {totals['crashes']} in {len(crashes.buckets)} buckets ({crashes.flaky} not reproduced)")
 
     
 if __name__ == "__main__":
-    main_loop()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shard', type=int, help="Fuzz the randomized schema of this shard")
+    parser.add_argument('--seed', type=int, help="Master seed of the campaign")
+    parser.add_argument('--log', help="Replay log path (default: bugs/campaign.log, or bugs/campaign-shard{n}.log)")
+    parser.add_argument('--verbose', action='store_true', help="Print every query and its outcome")
+    parser.add_argument('--backend', choices=["docker", "local", "inprocess"], default=BACKEND, help="Where the sqlite3 binaries run")
+    parser.add_argument('--sqlite-dir', default=sqlite_dir, help="Directory of the instrumented sqlite3 build")
+    parser.add_argument('--new-sqlite-dir', default=new_sqlite_dir, help="Directory of the reference sqlite3 binary")
+    parser.add_argument('--sqlite-lib', default=sqlite_lib, help="Instrumented libsqlite3.so for the inprocess backend")
+    parser.add_argument('--symbolized-dir', default=symbolized_dir, help="Directory of a sanitizer build used to bucket crashes")
+    parser.add_argument('--feedback', choices=["gcov", "plan"], default=FEEDBACK, help="Signal deciding queue admission")
+    parser.add_argument('--coverage-signal', choices=list(SIGNALS),
+                        help=f"Cheap check a run must pass before gcov measures it (default: plan with --feedback plan, else {COVERAGE_SIGNAL})")
+    parser.add_argument('--coverage-sample-rate', type=float, default=COVERAGE_SAMPLE_RATE, help="Share of the other runs measured anyway")
+    parser.add_argument('--coverage-map', default=COVERAGE_MAP_NAME, help="Shared memory name of the coverage map shared by the campaign's processes")
+    parser.add_argument('--resume-coverage', help="Coverage map snapshot to start from")
+    args = parser.parse_args()
+    if args.feedback == "plan" and args.coverage_signal not in (None, "plan"):
+        parser.error("--feedback plan only samples gcov: use --coverage-signal plan")
+    VERBOSE = args.verbose
+    sqlite_dir = args.sqlite_dir
+    new_sqlite_dir = args.new_sqlite_dir
+    sqlite_lib = args.sqlite_lib
+    symbolized_dir = args.symbolized_dir
+    FEEDBACK = args.feedback
+    COVERAGE_SIGNAL = args.coverage_signal or ("plan" if FEEDBACK == "plan" else COVERAGE_SIGNAL)
+    COVERAGE_SAMPLE_RATE = args.coverage_sample_rate
+    COVERAGE_MAP_NAME = args.coverage_map
+    main_loop(args.shard, args.seed, args.log, args.backend, args.resume_coverage)
@@ -0,0 +1,157 @@
+import bisect
+import json
+import time
+from collections import defaultdict
+
+# Upper bounds (in seconds) of the latency histogram buckets, doubling from 100us to ~100s
+BUCKETS = [0.0001 * 2 ** i for i in range(21)]
+
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Timer:
+    """Reusable context manager timing one phase into its histogram."""
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Counters, gauges and per-phase latency histograms of a fuzzing campaign.
+
+    `maybe_report()` is cheap to call every iteration: at most every `interval` seconds
+    it prints a one-line status and rewrites the JSON and Prometheus text exports.
+    """
+    def __init__(self, interval=5.0, json_path=None, prom_path=None):
+        self.interval = interval
+        self.json_path = json_path
+        self.prom_path = prom_path
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.phases = defaultdict(Histogram)
+        self.timers = {}
+
+    def time(self, phase):
+        timer = self.timers.get(phase)
+        if timer is None:
+            timer = self.timers[phase] = Timer(self.phases[phase])
+        return timer
+
+    def incr(self, name, n=1):
+        self.counters[name] += n
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.start
+        return {
+            "elapsed": elapsed,
+            "execs_per_sec": self.counters["execs"] / elapsed if elapsed else 0.0,
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "phases": {name: hist.to_dict() for name, hist in self.phases.items()},
+        }
+
+    def status_line(self, snap):
+        c = snap["counters"]
+        parts = [
+            f"[{snap['elapsed']:.0f}s]",
+            f"execs: {c.get('execs', 0)} ({snap['execs_per_sec']:.1f}/s)",
+            f"queue: {snap['gauges'].get('queue', 0)}",
+            f"syntax: {c.get('syntax_errors', 0)} (+{c.get('invalid_mutants', 0)} invalid)",
+            f"bugs: {c.get('bugs', 0)}",
+            f"crashes: {c.get('crashes', 0)} ({snap['gauges'].get('crash_buckets', 0)} unique)",
+            f"hangs: {c.get('hangs', 0)}",
+        ]
+        measured = c.get("coverage_runs", 0)
+        skipped = c.get("coverage_skipped", 0)
+        if skipped:
+            parts.append(f"gcov saved: {100 * skipped / (measured + skipped):.0f}%")
+        for name, hist in snap["phases"].items():
+            if hist["count"]:
+                parts.append(f"{name} {hist['sum'] / hist['count'] * 1000:.1f}ms")
+        return " | ".join(parts)
+
+    def to_prometheus(self, snap):
+        lines = [f"fuzzer_elapsed_seconds {snap['elapsed']}", f"fuzzer_execs_per_second {snap['execs_per_sec']}"]
+        for name, value in snap["counters"].items():
+            lines.append(f"fuzzer_{name}_total {value}")
+        for name, value in snap["gauges"].items():
+            lines.append(f"fuzzer_{name} {value}")
+        for name, hist in self.phases.items():
+            label = f'phase="{name}"'
+            seen = 0
+            for bound, n in zip(BUCKETS, hist.counts):
+                seen += n
+                lines.append(f'fuzzer_phase_seconds_bucket{{{label},le="{bound:g}"}} {seen}')
+            lines.append(f'fuzzer_phase_seconds_bucket{{{label},le="+Inf"}} {hist.count}')
+            lines.append(f"fuzzer_phase_seconds_sum{{{label}}} {hist.total}")
+            lines.append(f"fuzzer_phase_seconds_count{{{label}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        snap = self.snapshot()
+        print(self.status_line(snap), flush=True)
+        if self.json_path:
+            with open(self.json_path, "w") as f:
+                json.dump(snap, f, indent=2)
+        if self.prom_path:
+            with open(self.prom_path, "w") as f:
+                f.write(self.to_prometheus(snap))
+        self.last_report = time.perf_counter()
+
+    def maybe_report(self):
+        if time.perf_counter() - self.last_report >= self.interval:
+            self.report()
@@ -0,0 +1,57 @@
+from collections import Counter
+from typing import List, Tuple
+
+# Marker row printed before each oracle query so its rows can be told apart in one output
+MARKER = "--oracle-{}--"
+
+
+def build_oracle_script(query: str, cases: List[Tuple[str, List[str]]]) -> str:
+    """
+    Batch the mutant and all of its derived oracle queries into a single script,
+    each oracle query preceded by a SELECT of its marker row.
+    """
+    stmts = [query.rstrip().rstrip(";") + ";"]
+    n = 0
+    for _, queries in cases:
+        for q in queries:
+            stmts.append(f"SELECT '{MARKER.format(n)}';")
+            stmts.append(q + ";")
+            n += 1
+    return "\n".join(stmts)
+
+
+def split_oracle_output(stdout: str, count: int) -> List[List[str]]:
+    """Split the output of an oracle script into the rows of each of its `count` oracle queries."""
+    results = [[] for _ in range(count)]
+    markers = {MARKER.format(i): i for i in range(count)}
+    current = None
+    for line in stdout.splitlines():
+        if line in markers:
+            current = markers[line]
+        elif current is not None:
+            results[current].append(line)
+    return results
+
+
+def check_oracles(cases: List[Tuple[str, List[str]]], stdout: str) -> List[str]:
+    """
+    Compare the results of each oracle case in-process.
+    Returns the kinds of the cases whose invariant does not hold.
+    """
+    results = split_oracle_output(stdout, sum(len(q) for _, q in cases))
+    failed = []
+    i = 0
+    for kind, queries in cases:
+        rows = results[i:i + len(queries)]
+        i += len(queries)
+        if kind == "tlp":
+            union = Counter()
+            for part in rows[1:]:
+                union.update(part)
+            if Counter(rows[0]) != union:
+                failed.append(kind)
+        elif kind == "norec":
+            counts = [float(r[0]) if r and r[0] else 0.0 for r in rows]
+            if counts[0] != counts[1]:
+                failed.append(kind)
+    return failed
@@ -0,0 +1,57 @@
+import re
+
+# "3|Rowid|0|2|0||0|" (list mode, in-process worker) or "3       Rowid   0  2 ..." (shell explain mode)
+OPCODE_LINE = re.compile(r"^\s*\d+\s*\|?\s*([A-Z][A-Za-z0-9]+)\b")
+# "2|0|91|SEARCH t0 USING ..." (list mode) or "|--SEARCH t0 USING ..." (shell tree)
+PLAN_ROW = re.compile(r"^\d+\|\d+\|\d+\|(.*)$")
+PLAN_TREE = re.compile(r"^[|`\s-]*")
+NUMBERS = re.compile(r"\d+")
+
+
+def explain_script(query):
+    """Query plan and bytecode listing of `query`, without running it."""
+    query = query.strip().rstrip(";")
+    return f"EXPLAIN QUERY PLAN {query};\nEXPLAIN {query};\n"
+
+
+def plan_features(output):
+    """
+    Features of an explain_script() output: the shape of the query plan (its steps,
+    numbers masked) and every pair of consecutive VDBE opcodes, the bytecode analogue
+    of an edge in branch coverage.
+    """
+    features = set()
+    plan = []
+    previous = None
+    for line in output.decode(errors="replace").splitlines():
+        match = OPCODE_LINE.match(line)
+        if match:
+            opcode = match.group(1)
+            features.add(("op", previous, opcode))
+            previous = opcode
+            continue
+        if line.startswith(("QUERY PLAN", "addr ", "----")) or not line.strip():
+            continue
+        row = PLAN_ROW.match(line)
+        detail = row.group(1) if row else PLAN_TREE.sub("", line)
+        plan.append(NUMBERS.sub("N", detail))
+    if plan:
+        features.add(("plan", tuple(plan)))
+    return features
+
+
+class PlanFeedback:
+    """
+    Novelty feedback from EXPLAIN / EXPLAIN QUERY PLAN, a cheap stand-in for gcov.
+
+    A query is interesting when its plan shape or one of its opcode pairs was never seen
+    before. Which queries still get a gcov measurement is up to coverage_policy.
+    """
+    def __init__(self):
+        self.seen = set()
+
+    def observe(self, output):
+        """Record the features of an explain_script() output and return how many were new."""
+        new = plan_features(output) - self.seen
+        self.seen |= new
+        return len(new)
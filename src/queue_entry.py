@@ -1,27 +1,109 @@
+from collections import OrderedDict
+from sqlglot import parse_one
+
+# Upper bound on the SQL text (in characters) whose parsed ASTs are kept in memory.
+# A sqlglot AST is roughly two orders of magnitude larger than its source string.
+AST_CACHE_LIMIT = 256 * 1024
+
+
+class ASTCache:
+    """
+    LRU bookkeeping for the ASTs memoized on queue entries.
+
+    Entries are charged by the length of their SQL string. When the total exceeds
+    `limit`, the least recently used entries drop their AST and re-parse it lazily
+    the next time they are mutated.
+    """
+    def __init__(self, limit=AST_CACHE_LIMIT):
+        self.limit = limit
+        self.size = 0
+        self.entries = OrderedDict()
+        self.parses = 0
+        self.evictions = 0
+
+    def touch(self, entry):
+        self.entries.move_to_end(entry)
+
+    def add(self, entry):
+        if entry in self.entries:
+            self.touch(entry)
+            return
+        self.entries[entry] = len(entry.sql)
+        self.size += len(entry.sql)
+        while self.size > self.limit and len(self.entries) > 1:
+            old, cost = self.entries.popitem(last=False)
+            old._ast = None
+            self.size -= cost
+            self.evictions += 1
+
+    def discard(self, entry):
+        cost = self.entries.pop(entry, None)
+        if cost is not None:
+            self.size -= cost
+
+    def __repr__(self):
+        return f"<ASTCache ({len(self.entries)} ASTs, {self.size}/{self.limit} chars, parses: {self.parses}, evictions: {self.evictions})>"
+
+
 class QueueEntry:
     """
     A class representing a queue entry for an SQL query.
 
     sql (str): The SQL query string.
     mutation_count (int): The number of mutations applied to the query.
-    prev_coverage (int): The previous coverage value before the last mutation.
-    new_coverage (int): The new coverage value after the last mutation.
-    last_technique (str): The last mutation technique used.
+    found (int): New coverage its mutants found since its mutation count was last reset: lines
+        added to the global coverage map (see src/coverage_map.py), or iterations with a new
+        plan under plan feedback.
+    id (int): Campaign-wide id of the entry, as referenced by the replay log.
+    exec_time (float): Wall-clock seconds of the query's own run on the instrumented binary.
+    ast (exp.Expression): The parsed query, built lazily and memoized under `QueueEntry.cache`.
     """
-    def __init__(self, sql, cov, mutation_count=0):
-        self.sql = sql                     
+    __slots__ = ("id", "sql", "mutation_count", "found", "exec_time", "_ast")
+
+    cache = ASTCache()
+
+    def __init__(self, sql, mutation_count=0, ast=None, entry_id=None, exec_time=0.0):
+        self.id = entry_id
+        self.sql = sql
         self.mutation_count = mutation_count
-        self.prev_coverage = cov
-        self.new_coverage = cov
+        self.found = 0
+        self.exec_time = exec_time
+        self._ast = None
+        if ast is not None:
+            self._set_ast(ast)
 
-    def update_coverage(self, new_cov):
-        self.new_coverage = new_cov
+    def _set_ast(self, ast):
+        self._ast = ast
+        QueueEntry.cache.add(self)
+
+    @property
+    def ast(self):
+        if self._ast is None:
+            QueueEntry.cache.parses += 1
+            self._set_ast(parse_one(self.sql, error_level='IGNORE'))
+        else:
+            QueueEntry.cache.touch(self)
+        return self._ast
+
+    @property
+    def ast_cached(self):
+        """Whether the AST is currently held in memory (otherwise `ast` will parse it)."""
+        return self._ast is not None
+
+    def release(self):
+        """Drop the memoized AST, e.g. when the entry leaves the queue for good."""
+        QueueEntry.cache.discard(self)
+        self._ast = None
+
+    def update_coverage(self, found):
+        self.found += found
 
     def has_new_coverage(self):
-        return self.new_coverage > self.prev_coverage
-    
+        return self.found > 0
+
     def reset_mutation_count(self):
         self.mutation_count = 0
+        self.found = 0
 
     def __repr__(self):
-        return f"<Query (mut#{self.mutation_count}, cov-old: {self.prev_coverage}, cov-new: {self.new_coverage})>"
+        return f"<Query (mut#{self.mutation_count}, found: {self.found} lines)>"
@@ -0,0 +1,195 @@
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import random
+import struct
+from sqlglot import parse_one
+
+MAGIC = b"SQLR"
+VERSION = 2
+# magic, version, master seed, shard (-1: fixed schema), mutants per iteration, number of seed queries
+HEADER = struct.Struct("<4sBQiHH")
+# iteration, parent id, child id (-1: not admitted), donor id (-1: none), mutant index, engine, flags, iteration seed, mutant hash
+RECORD = struct.Struct("<IIiiBBBQ8s")
+
+ENGINE_MUTATION = 0
+ENGINE_GRAMMAR = 1
+ENGINE_SPLICE = 2
+
+# The parent AST was parsed from its SQL for this iteration instead of reused from memory
+FLAG_PARSED = 1
+# Same for the donor AST of a splice
+FLAG_DONOR_PARSED = 2
+
+
+def derive_seed(master_seed, *names):
+    """Derive an independent 64-bit seed for a named stream (campaign, worker, db...)."""
+    return random.Random(":".join(str(part) for part in (master_seed,) + names)).getrandbits(64)
+
+
+def mutant_hash(sql):
+    return hashlib.blake2b(sql.encode(), digest_size=8).digest()
+
+
+def schedule_path(path):
+    """Sidecar of a replay log holding the mutation stage probabilities in effect over time."""
+    return path + ".schedule"
+
+
+class ReplayLog:
+    """
+    Compact binary execution log of a campaign: a header with the master seed, the
+    shard and the seed queries, then one fixed-size record per generated mutant.
+    Together they are enough to regenerate any mutant without rerunning the campaign.
+
+    When the mutation stage probabilities change, the new ones are appended to the
+    schedule sidecar (one JSON line per change) along with the first iteration using them.
+    """
+    def __init__(self, path, master_seed, shard, attempts, seed_queries):
+        self.schedule = open(schedule_path(path), "w")
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, master_seed, -1 if shard is None else shard, attempts, len(seed_queries)))
+        for sql in seed_queries:
+            data = sql.encode()
+            self.file.write(struct.pack("<I", len(data)))
+            self.file.write(data)
+
+    def record(self, iteration, parent_id, child_id, index, engine, parsed, seed, sql, donor_id=None, donor_parsed=False):
+        flags = (FLAG_PARSED if parsed else 0) | (FLAG_DONOR_PARSED if donor_parsed else 0)
+        self.file.write(RECORD.pack(
+            iteration, parent_id, -1 if child_id is None else child_id, -1 if donor_id is None else donor_id,
+            index, engine, flags, seed, mutant_hash(sql)
+        ))
+
+    def record_schedule(self, iteration, probs):
+        self.schedule.write(json.dumps({"iteration": iteration, "probs": probs}) + "\n")
+        self.schedule.flush()
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+        self.schedule.close()
+
+
+def read_schedule(path):
+    """(iterations, probs) of the schedule changes logged next to the replay log at `path`."""
+    iterations, probs = [], []
+    if os.path.exists(schedule_path(path)):
+        with open(schedule_path(path)) as f:
+            for line in f:
+                change = json.loads(line)
+                iterations.append(change["iteration"])
+                probs.append(change["probs"])
+    return iterations, probs
+
+
+def read_log(path):
+    """Return (master_seed, shard, attempts, seed_queries, records) from a replay log."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, master_seed, shard, attempts, n_seeds = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} replay log")
+    offset = HEADER.size
+    seed_queries = []
+    for _ in range(n_seeds):
+        (length,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        seed_queries.append(data[offset:offset + length].decode())
+        offset += length
+    records = [RECORD.unpack_from(data, pos) for pos in range(offset, len(data) - RECORD.size + 1, RECORD.size)]
+    return master_seed, None if shard < 0 else shard, attempts, seed_queries, records
+
+
+class Replayer:
+    """Regenerates mutants recorded in a replay log, walking back to the seed queries."""
+
+    def __init__(self, path):
+        from scripts import create_fixed_db, create_random_db
+        from generator import Generator
+        from grammar import GrammarGenerator
+        from scheduler import BASE_PROBS
+
+        self.master_seed, self.shard, self.attempts, self.seed_queries, self.records = read_log(path)
+        db = create_fixed_db() if self.shard is None else create_random_db(self.shard)
+        self.gen = Generator(db.to_json())
+        self.grammar = GrammarGenerator(db.to_json())
+        self.base_probs = BASE_PROBS
+        self.schedule_iterations, self.schedule_probs = read_schedule(path)
+        self.by_child = {rec[2]: rec for rec in self.records if rec[2] >= 0}
+        self.entries = {}
+
+    def entry(self, entry_id):
+        """(sql, ast) of a queue entry, as the campaign held it in memory."""
+        if entry_id in self.entries:
+            return self.entries[entry_id]
+        if entry_id < len(self.seed_queries):
+            sql = self.seed_queries[entry_id]
+            result = (sql, parse_one(sql, error_level='IGNORE'))
+        elif entry_id in self.by_child:
+            result = self.regenerate(self.by_child[entry_id])
+        else:
+            raise KeyError(f"Entry {entry_id} is not in the log")
+        self.entries[entry_id] = result
+        return result
+
+    def ast_of(self, entry_id, parsed):
+        """The AST an iteration mutated: re-parsed from the SQL if the campaign had to, else the one in memory."""
+        sql, ast = self.entry(entry_id)
+        if parsed or ast is None:
+            ast = parse_one(sql, error_level='IGNORE')
+        return ast
+
+    def regenerate(self, record):
+        iteration, parent_id, child_id, donor_id, index, engine, flags, seed, digest = record
+        if engine == ENGINE_GRAMMAR:
+            self.grammar.rng.seed(seed)
+            mutants = [(sql, None) for sql in self.grammar.generate(self.attempts)]
+        elif engine == ENGINE_SPLICE:
+            parent_ast = self.ast_of(parent_id, flags & FLAG_PARSED)
+            donor_ast = self.ast_of(donor_id, flags & FLAG_DONOR_PARSED)
+            self.gen.rng.seed(seed)
+            mutants = self.gen.splice(parent_ast, donor_ast, self.attempts)
+        else:
+            parent_ast = self.ast_of(parent_id, flags & FLAG_PARSED)
+            change = bisect.bisect_right(self.schedule_iterations, iteration) - 1
+            self.gen.probs = dict(self.schedule_probs[change] if change >= 0 else self.base_probs)
+            self.gen.rng.seed(seed)
+            mutants = self.gen.mutate_ast(parent_ast, self.attempts)
+
+        sql, ast = mutants[index]
+        if mutant_hash(sql) != digest:
+            print(f"Warning: mutant {index} of iteration {iteration} does not match its logged hash")
+        return sql, ast
+
+    def find(self, iteration, index):
+        for rec in self.records:
+            if rec[0] == iteration and rec[4] == index:
+                return rec
+        raise KeyError(f"No mutant {index} in iteration {iteration}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate a mutant from a campaign replay log")
+    parser.add_argument('log')
+    parser.add_argument('--entry', type=int, help="Queue entry id to regenerate")
+    parser.add_argument('--iteration', type=int, help="Iteration of the mutant to regenerate")
+    parser.add_argument('--index', type=int, default=0, help="Mutant index within the iteration")
+    args = parser.parse_args()
+
+    replayer = Replayer(args.log)
+    if args.entry is not None:
+        sql, _ = replayer.entry(args.entry)
+    elif args.iteration is not None:
+        sql, _ = replayer.regenerate(replayer.find(args.iteration, args.index))
+    else:
+        parser.error("one of --entry or --iteration is required")
+    print(sql)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import json
+import random
+
+# Mutation stages of Generator.mutate_ast, in application order
+OPERATORS = ("table", "literals", "operators", "where", "join", "group_by", "order_by", "limit")
+# Hand-tuned probability of each stage, the starting point of the schedule
+BASE_PROBS = {
+    "table": 1.0, "literals": 1.0, "operators": 1.0, "where": 0.45,
+    "join": 0.2, "group_by": 0.4, "order_by": 0.4, "limit": 0.3,
+}
+# No stage is ever switched off, nor scaled beyond always
+MIN_PROB = 0.05
+MAX_PROB = 1.0
+# Rewarded mutants between two schedule updates
+EPOCH = 200
+# Weight of past epochs in the statistics, so the schedule follows the campaign's phases
+DECAY = 0.8
+
+
+class OperatorStats:
+    __slots__ = ("applied", "wins", "syntax_errors", "total_applied", "total_wins", "total_syntax_errors")
+
+    def __init__(self):
+        self.applied = 0.0
+        self.wins = 0.0
+        self.syntax_errors = 0.0
+        self.total_applied = 0
+        self.total_wins = 0
+        self.total_syntax_errors = 0
+
+    def to_dict(self):
+        return {
+            "applied": self.total_applied,
+            "wins": self.total_wins,
+            "syntax_errors": self.total_syntax_errors,
+            "yield": self.total_wins / self.total_applied if self.total_applied else 0.0,
+            "syntax_error_rate": self.total_syntax_errors / self.total_applied if self.total_applied else 0.0,
+        }
+
+
+class OperatorScheduler:
+    """
+    Bandit schedule of the mutation stages, in the spirit of MOpt.
+
+    Every mutant records the stages applied to it, and its outcome is credited to each of
+    them: a win for new coverage or a finding, a loss otherwise, syntax errors being
+    tracked on their own. Every EPOCH mutants, each stage samples a success rate from
+    Beta(1 + wins, 1 + losses) (Thompson sampling) and its probability becomes its base
+    probability scaled by that sample relative to the mean of all stages.
+
+    Stage decisions are drawn from the generator's own stream, so with the probabilities
+    in `probs` (logged by the campaign at each update) a mutant still replays from its seed.
+    """
+    def __init__(self, rng=None, epoch=EPOCH, decay=DECAY):
+        self.rng = rng or random.Random()
+        self.epoch = epoch
+        self.decay = decay
+        self.probs = dict(BASE_PROBS)
+        self.stats = {op: OperatorStats() for op in OPERATORS}
+        self.rewarded = 0
+        self.updates = 0
+
+    def reward(self, operators, win=False, syntax_error=False):
+        """Credit the outcome of one mutant to the stages in `operators`."""
+        for op in operators:
+            stats = self.stats[op]
+            stats.applied += 1
+            stats.total_applied += 1
+            if win:
+                stats.wins += 1
+                stats.total_wins += 1
+            if syntax_error:
+                stats.syntax_errors += 1
+                stats.total_syntax_errors += 1
+        self.rewarded += 1
+
+    def due(self):
+        return self.rewarded >= self.epoch
+
+    def update(self):
+        """Draw the next schedule from the statistics and return it."""
+        samples = {}
+        for op, stats in self.stats.items():
+            samples[op] = self.rng.betavariate(1 + stats.wins, 1 + stats.applied - stats.wins)
+            stats.applied *= self.decay
+            stats.wins *= self.decay
+            stats.syntax_errors *= self.decay
+        mean = sum(samples.values()) / len(samples)
+        for op, sample in samples.items():
+            self.probs[op] = min(MAX_PROB, max(MIN_PROB, BASE_PROBS[op] * sample / mean))
+        self.rewarded = 0
+        self.updates += 1
+        return dict(self.probs)
+
+    def to_dict(self):
+        return {
+            "updates": self.updates,
+            "probs": dict(self.probs),
+            "operators": {op: stats.to_dict() for op, stats in self.stats.items()},
+        }
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
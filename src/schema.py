@@ -1,4 +1,6 @@
+import os
 import random
+import sqlite3
 import string
 from enum import Enum
 from typing import List, Optional, Tuple
@@ -16,19 +18,38 @@ class ColumnType(Enum):
     REAL = "REAL"
     BOOLEAN = "BOOLEAN"
 
+COLLATIONS = ["BINARY", "NOCASE", "RTRIM"]
+
 class Database:
     counter = 0
 
-    def __init__(self):
+    def __init__(self, rng=None):
         self.name = f"db{Database.counter}"
+        # Random stream for row values and data statements of this database
+        self.rng = rng or random.Random()
         Database.counter += 1
         self.tables = []
+        self.views = []
+        # Name counters are per database so that several schemas can coexist
+        self.table_counter = 0
+        self.column_counter = 0
+        self.view_counter = 0
 
     def create_table(self):
         table = Table(self)
         self.tables.append(table)
         return table
 
+    def create_view(self, table, columns, where=None):
+        view = View(self, table, columns, where)
+        self.views.append(view)
+        return view
+
+    def next_column_name(self):
+        name = f"c{self.column_counter}"
+        self.column_counter += 1
+        return name
+
     def to_sql(self):
         stmts = []
         for table in self.tables:
@@ -37,28 +58,131 @@ class Database:
             stmts.extend(table.update_sql())
             stmts.extend(table.index_sql())
             stmts.extend(table.add_column_sql())
-        stmts.extend(self.tables[2].delete_sql())
-        stmts.extend(self.tables[3].delete_sql())
+        for table in self.tables[2:4]:
+            stmts.extend(table.delete_sql())
+        stmts.extend(view.create_view_sql() for view in self.views)
         return "\n".join(stmts)
 
+    def to_sqlite(self, path):
+        """
+        Build the database file directly with Python's sqlite3 module, in the statement
+        order of `to_sql()` within each table. Rows are bound through executemany in one
+        unjournaled transaction, before any index exists: the UNIQUE constraints of tables
+        with bulk-generated rows become indexes built after the load (see
+        `Table.unique_index_sql`). The remaining statements run in a second, journaled
+        transaction, so that a failing one is rolled back; INSERT OR IGNORE and
+        per-statement error skipping mirror how the sqlite3 shell carries on past failing
+        statements of a replayed script.
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+
+        def run(stmts):
+            for stmt in stmts:
+                try:
+                    conn.execute(stmt)
+                except sqlite3.Error:
+                    pass
+
+        conn.execute("BEGIN")
+        deferred = [table.data is not None and not table.without_rowid for table in self.tables]
+        for table, defer in zip(self.tables, deferred):
+            run([table.create_table_sql(defer_unique=defer)])
+            placeholders = ", ".join("?" for _ in table.columns)
+            conn.executemany(f"INSERT OR IGNORE INTO {table.name} VALUES ({placeholders})", table.row_values())
+        conn.execute("COMMIT")
+
+        conn.execute("PRAGMA journal_mode = MEMORY")
+        conn.execute("BEGIN")
+        for table, defer in zip(self.tables, deferred):
+            for index, dedup in table.unique_index_sql() if defer else []:
+                try:
+                    conn.execute(index)
+                except sqlite3.IntegrityError:
+                    run([dedup, index])
+            run(table.update_sql())
+            run(table.index_sql())
+            run(table.add_column_sql())
+        for table in self.tables[2:4]:
+            run(table.delete_sql())
+        run([view.create_view_sql() for view in self.views])
+        conn.execute("COMMIT")
+        conn.close()
+        return path
+
     def to_json(self):
-        return {
+        schema = {
             table.name: {
-                col.name: col.col_type.value for col in table.columns + table.extra_columns
+                col.name: col.col_type.value for col in table.columns + table.generated_columns + table.extra_columns
             } for table in self.tables
         }
+        for view in self.views:
+            schema[view.name] = {
+                alias: col.col_type.value for col, alias in zip(view.columns, view.aliases)
+            }
+        return schema
 
-class Table:
-    counter = 0
+class SchemaIndex:
+    """
+    Lookup tables derived once from a `Database.to_json()` schema, so that the
+    generator never has to rescan the schema while mutating.
+
+    tables (list): All table names.
+    columns (dict): table -> list of (column, type) pairs.
+    column_names (dict): table -> list of column names.
+    column_table (dict): column -> owning table.
+    other_tables (dict): table -> list of all other table names.
+
+    The type-compatible join columns of two tables (see join_pairs) are only computed
+    for the pairs actually asked for: on wide schemas, all pairs would be O(T²·C²).
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.tables = list(schema.keys())
+        self.columns = {table: list(cols.items()) for table, cols in schema.items()}
+        self.column_names = {table: list(cols.keys()) for table, cols in schema.items()}
+        self.column_table = {col: table for table, cols in schema.items() for col in cols}
+        self.other_tables = {
+            table: [t for t in self.tables if t != table] for table in self.tables
+        }
+        self._join_pairs = {}
 
+    def join_pairs(self, table, other):
+        """Type-compatible (column, other_column) pairs of two tables, memoized."""
+        pairs = self._join_pairs.get((table, other))
+        if pairs is None:
+            by_type = {}
+            for col2, type2 in self.schema[other].items():
+                by_type.setdefault(type2, []).append(col2)
+            pairs = self._join_pairs[(table, other)] = [
+                (col1, col2) for col1, type1 in self.schema[table].items() for col2 in by_type.get(type1, ())
+            ]
+        return pairs
+
+    def columns_of(self, tables):
+        """All (column, type) pairs of the given tables, ignoring unknown names."""
+        cols = []
+        for table in tables:
+            cols.extend(self.columns.get(table, ()))
+        return cols
+
+
+class Table:
     def __init__(self, database):
         self.database = database
-        self.name = f"t{Table.counter}"
-        Table.counter += 1
+        self.name = f"t{database.table_counter}"
+        database.table_counter += 1
         self.columns = []
         self.rows = []
         self.extra_columns = []
+        self.generated_columns = []
         self.indexes = []
+        self.without_rowid = False
+        # Columnar (values, nulls) arrays from create_rows, emitted after self.rows
+        self.data = None
 
     def create_column(self, col_type):
         column = Column(self, col_type)
@@ -70,28 +194,54 @@ class Table:
         self.extra_columns.append(column)
         return column
 
-    def create_index(self, column, unique=False):
-        self.indexes.append((column, unique))
+    def create_generated_column(self, col_type, expression, stored=False):
+        column = Column(self, col_type)
+        column.generated = (expression, stored)
+        self.generated_columns.append(column)
+        return column
+
+    def create_index(self, column, unique=False, where=None):
+        # `column` may also be a list of columns for a composite index
+        columns = column if isinstance(column, list) else [column]
+        self.indexes.append((columns, unique, where))
 
     def create_row(self, null_probability=0.5):
         row = Row(self, null_probability)
         self.rows.append(row)
         return row
 
-    def create_table_sql(self):
+    def create_rows(self, count, seed=None, distribution=None):
+        """
+        Bulk-generate `count` rows a whole column at a time with NumPy, reproducible
+        from `seed`. See `datagen.Distribution` for the available knobs.
+        """
+        from datagen import generate_columns
+        self.data = generate_columns(self.columns, count, seed, distribution)
+        return self.data
+
+    def create_table_sql(self, defer_unique=False):
+        """CREATE TABLE statement; with `defer_unique`, UNIQUE constraints are left to `unique_index_sql()`."""
         col_defs = []
         for col in self.columns:
             constraint_parts = []
             for ctype, val in col.constraints:
+                if ctype == ConstraintType.UNIQUE and defer_unique:
+                    continue
                 if ctype in {ConstraintType.NOT_NULL, ConstraintType.UNIQUE, ConstraintType.PRIMARY_KEY}:
                     constraint_parts.append(ctype.value)
                 elif ctype == ConstraintType.DEFAULT and val:
                     constraint_parts.append(f"DEFAULT {val}")
                 elif ctype == ConstraintType.CHECK and val:
                     constraint_parts.append(f"CHECK ({val})")
+            if col.collation:
+                constraint_parts.append(f"COLLATE {col.collation}")
             constraint_str = " ".join(constraint_parts)
             col_defs.append(f"{col.name} {col.col_type.value} {constraint_str}".strip())
-        return f"CREATE TABLE {self.name} ({', '.join(col_defs)});"
+        for col in self.generated_columns:
+            expression, stored = col.generated
+            col_defs.append(f"{col.name} {col.col_type.value} GENERATED ALWAYS AS ({expression}) {'STORED' if stored else 'VIRTUAL'}")
+        suffix = " WITHOUT ROWID" if self.without_rowid else ""
+        return f"CREATE TABLE {self.name} ({', '.join(col_defs)}){suffix};"
 
     def insert_sql(self):
         stmts = []
@@ -106,14 +256,52 @@ class Table:
                     placeholders.append(str(val))
             stmt = f"INSERT INTO {self.name} VALUES ({', '.join(placeholders)});"
             stmts.append(stmt)
+        if self.data:
+            from datagen import columns_to_sql
+            stmts.extend(columns_to_sql(self.name, self.columns, self.data))
         return stmts
 
+    def row_values(self):
+        """Yield each row (including bulk-generated ones) as a tuple of Python values."""
+        for row in self.rows:
+            yield tuple(row.values)
+        if self.data:
+            columns = [[None if null else val for val, null in zip(values, nulls)] for values, nulls in self.data]
+            yield from zip(*columns)
+
+    def to_csv(self):
+        """CSV text of the bulk-generated rows, for the sqlite3 shell's `.import`."""
+        from datagen import columns_to_csv
+        return columns_to_csv(self.columns, self.data)
+
+    def import_sql(self, csv_path):
+        """Shell commands loading `to_csv()` output saved at `csv_path` into this table."""
+        from datagen import csv_import_sql
+        return csv_import_sql(self.name, self.columns, csv_path)
+
+    def unique_index_sql(self):
+        """
+        The UNIQUE constraints left out by `create_table_sql(defer_unique=True)`, as
+        (index, dedup) statement pairs: the index is built after the rows are loaded, and
+        if it fails on duplicates, `dedup` first deletes the rows the constraint would have
+        ignored on insert, keeping the first of each value (NULLs never conflict).
+        """
+        pairs = []
+        for col in self.columns:
+            if not any(ctype == ConstraintType.UNIQUE for ctype, _ in col.constraints):
+                continue
+            index = f"CREATE UNIQUE INDEX uq_{self.name}_{col.name} ON {self.name}({col.name});"
+            dedup = (f"DELETE FROM {self.name} WHERE {col.name} IS NOT NULL AND rowid NOT IN "
+                     f"(SELECT MIN(rowid) FROM {self.name} WHERE {col.name} IS NOT NULL GROUP BY {col.name});")
+            pairs.append((index, dedup))
+        return pairs
+
     def update_sql(self):
         stmts = []
         if not self.columns:
             return stmts
-        col = random.choice(self.columns)
-        value = Row.generate_value(self, col.col_type)
+        col = self.database.rng.choice(self.columns)
+        value = Row.generate_value(col.col_type, self.database.rng)
         stmt = f"UPDATE {self.name} SET {col.name} = {value} WHERE 1=1 LIMIT 50;"
         stmts.append(stmt)
         return stmts
@@ -121,16 +309,21 @@ class Table:
     def delete_sql(self):
         if not self.columns:
             return []
-        col = random.choice(self.columns)
+        col = self.database.rng.choice(self.columns)
         return [f"DELETE FROM {self.name} WHERE {col.name} < 20;",
                 f"DELETE FROM {self.name} WHERE {col.name} IS NOT NULL;"]
 
     def index_sql(self):
         stmts = []
-        for col, unique in self.indexes:
-            index_name = f"idx_{self.name}_{col.name}"
+        names = set()
+        for i, (cols, unique, where) in enumerate(self.indexes):
+            index_name = f"idx_{self.name}_{'_'.join(col.name for col in cols)}"
+            if index_name in names:
+                index_name = f"{index_name}_{i}"
+            names.add(index_name)
             unique_str = "UNIQUE " if unique else ""
-            stmt = f"CREATE {unique_str}INDEX {index_name} ON {self.name}({col.name});"
+            where_str = f" WHERE {where}" if where else ""
+            stmt = f"CREATE {unique_str}INDEX {index_name} ON {self.name}({', '.join(col.name for col in cols)}){where_str};"
             stmts.append(stmt)
         return stmts
 
@@ -141,14 +334,30 @@ class Table:
             stmts.append(stmt)
         return stmts
 
-class Column:
-    counter = 0
+class View:
+    def __init__(self, database, table, columns, where=None):
+        self.database = database
+        self.name = f"v{database.view_counter}"
+        database.view_counter += 1
+        self.table = table
+        self.columns = columns
+        # Views expose their columns under fresh names to keep column names schema-unique
+        self.aliases = [database.next_column_name() for _ in columns]
+        self.where = where
 
+    def create_view_sql(self):
+        projection = ", ".join(f"{col.name} AS {alias}" for col, alias in zip(self.columns, self.aliases))
+        where_str = f" WHERE {self.where}" if self.where else ""
+        return f"CREATE VIEW {self.name} AS SELECT {projection} FROM {self.table.name}{where_str};"
+
+class Column:
     def __init__(self, table, col_type):
         self.table = table
-        self.name = f"c{Column.counter}"
-        Column.counter += 1
+        self.name = table.database.next_column_name()
         self.col_type = col_type
+        self.collation = None
+        # (expression, stored) for generated columns
+        self.generated = None
         self.constraints: List[Tuple[ConstraintType, Optional[str]]] = []
 
     def add_constraint(self, constraint_type: ConstraintType, value: Optional[str] = None):
@@ -159,21 +368,23 @@ class Row:
     def __init__(self, table, null_probability):
         self.table = table
         self.values = []
+        rng = table.database.rng
         for col in table.columns:
-            if random.random() < null_probability:
+            if rng.random() < null_probability:
                 self.values.append(None)
             else:
-                self.values.append(self.generate_value(col.col_type))
+                self.values.append(self.generate_value(col.col_type, rng))
 
-    def generate_value(self, col_type):
+    @staticmethod
+    def generate_value(col_type, rng=random):
         if col_type == ColumnType.INTEGER:
-            return random.randint(0, 100)
+            return rng.randint(0, 100)
         elif col_type == ColumnType.TEXT:
-            return ''.join(random.choices(string.ascii_letters, k=5))
+            return ''.join(rng.choices(string.ascii_letters, k=5))
         elif col_type == ColumnType.REAL:
-            return round(random.uniform(0, 100), 2)
+            return round(rng.uniform(0, 100), 2)
         elif col_type == ColumnType.BOOLEAN:
-            return random.choice([0, 1])
+            return rng.choice([0, 1])
         else:
             raise ValueError(f"Unsupported column type: {col_type}")
 
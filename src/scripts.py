@@ -1,30 +1,48 @@
+import asyncio
 import subprocess
 import os
 import re
-import tempfile
-from schema import Database, ColumnType, ConstraintType
+import shutil
+import signal
+import random
+from schema import Database, ColumnType, ConstraintType, COLLATIONS
 
 TEMP_DB_PATH = "/home/test/test.db"
 
-def setup_db(container_name, sqlite_dir, sqlite_binary, db_path=TEMP_DB_PATH, local_path="bugs/test.db"):
+# Appended to stderr when a query exceeds its wall-clock limit
+TIMEOUT_MARKER = "Query timed out"
+# Printed by the sqlite3 shell when `.progress --limit` interrupts a statement
+PROGRESS_MARKER = "Progress limit reached"
+# Extra seconds the client waits for the container-side `timeout` before giving up on docker exec
+TIMEOUT_GRACE = 1.0
+
+def setup_db(backend, sqlite_dir, sqlite_binary, db_path=TEMP_DB_PATH, local_path="bugs/test.db", build_locally=True, shard=None, rng=None):
+    # Without a shard, every campaign uses the same fixed schema
+    db = create_fixed_db(rng) if shard is None else create_random_db(shard)
+
+    if build_locally:
+        # Build the file locally in a single transaction, then ship it to the backend
+        db.to_sqlite(local_path)
+        print(f"Database built at {local_path}")
+        backend.install_db(local_path, db_path)
+        return db.to_json()
+
     # Step 1: Remove file only if it exists
-    subprocess.run([
-        "docker", "exec", container_name,
-        "sh", "-c", f"if [ -f {db_path} ]; then rm {db_path}; fi"
-    ], capture_output=True)
+    backend.remove_db(db_path)
 
-    # Step 2: Create a fresh new SQLite database file
-    result = subprocess.run([
-        "docker", "exec", container_name,
-        "sh", "-c", f"cd {sqlite_dir} && ./{sqlite_binary} {db_path} ''"
-    ], capture_output=True)
+    # Step 2: Replay the schema and data as one SQL script, which creates the file
+    sql = db.to_sql()
+    stdout, stderr = backend.run_query(sqlite_dir, sqlite_binary, sql, db_path=db_path)
 
-    if result.returncode != 0:
-        print("Error creating DB:")
-        print(result.stderr.decode())
+    # Step 3: Keep a local copy of the database
+    backend.fetch_db(db_path, local_path)
 
-    # Step 3: Create fixed schema
-    db = Database()
+    # return db
+    return db.to_json()
+
+# Fixed schema: 5 tables of 3 columns and 400 rows, plus an extra column on tables 0-2
+def create_fixed_db(rng=None):
+    db = Database(rng)
     fixed_types = [ColumnType.INTEGER, ColumnType.TEXT, ColumnType.REAL, ColumnType.BOOLEAN]
     fixed_constraints = [ ConstraintType.PRIMARY_KEY, ConstraintType.NOT_NULL, ConstraintType.UNIQUE, ConstraintType.DEFAULT, ConstraintType.CHECK]
 
@@ -50,22 +68,79 @@ def setup_db(container_name, sqlite_dir, sqlite_binary, db_path=TEMP_DB_PATH, lo
     db.tables[0].create_extra_column(ColumnType.INTEGER)
     db.tables[1].create_extra_column(ColumnType.REAL)
     db.tables[2].create_extra_column(ColumnType.TEXT)
+    return db
 
-    sql = db.to_sql()
-    stdout, stderr = run_query(container_name, sqlite_dir, sqlite_binary, sql, db_path=db_path)
+# Randomized schema for one fuzzing shard, fully determined by the shard number.
+# Generated columns need sqlite >= 3.31, disable them for older binaries.
+def create_random_db(shard, max_tables=6, max_columns=5, rows=400, generated_columns=True):
+    rng = random.Random(shard)
+    db = Database(rng)
+    col_types = list(ColumnType)
+
+    for _ in range(rng.randint(2, max_tables)):
+        table = db.create_table()
+        table.without_rowid = rng.random() < 0.25
+        has_pk = False
 
+        for _ in range(rng.randint(1, max_columns)):
+            col = table.create_column(rng.choice(col_types))
+            numeric = col.col_type != ColumnType.TEXT
+            if not numeric and rng.random() < 0.5:
+                col.collation = rng.choice(COLLATIONS)
+            if rng.random() < 0.6:
+                ctype = rng.choice(list(ConstraintType))
+                if ctype == ConstraintType.PRIMARY_KEY and has_pk:
+                    ctype = ConstraintType.UNIQUE
+                has_pk = has_pk or ctype == ConstraintType.PRIMARY_KEY
+                if ctype == ConstraintType.DEFAULT:
+                    col.add_constraint(ctype, str(rng.randint(0, 100)) if numeric else "'x'")
+                elif ctype == ConstraintType.CHECK:
+                    col.add_constraint(ctype, f"{col.name} >= 0" if numeric else f"length({col.name}) < 10")
+                else:
+                    col.add_constraint(ctype)
+
+        # WITHOUT ROWID tables require a PRIMARY KEY
+        if table.without_rowid and not has_pk:
+            table.columns[0].add_constraint(ConstraintType.PRIMARY_KEY)
+
+        if generated_columns and rng.random() < 0.4:
+            source = rng.choice(table.columns)
+            if source.col_type == ColumnType.TEXT:
+                table.create_generated_column(ColumnType.TEXT, f"upper({source.name}) || 'g'", stored=rng.random() < 0.5)
+            else:
+                table.create_generated_column(source.col_type, f"{source.name} * 2 + 1", stored=rng.random() < 0.5)
+
+        for _ in range(rows):
+            table.create_row()
+
+        # Single, composite, UNIQUE and partial indexes
+        for _ in range(rng.randint(0, 3)):
+            cols = rng.sample(table.columns, k=rng.randint(1, min(3, len(table.columns))))
+            where = f"{cols[0].name} IS NOT NULL" if rng.random() < 0.3 else None
+            table.create_index(cols, unique=rng.random() < 0.2, where=where)
+
+        if rng.random() < 0.3:
+            table.create_extra_column(rng.choice(col_types))
+
+    for _ in range(rng.randint(0, 2)):
+        table = rng.choice(db.tables)
+        cols = rng.sample(table.columns, k=rng.randint(1, len(table.columns)))
+        where = f"{cols[0].name} IS NOT NULL" if rng.random() < 0.5 else None
+        db.create_view(table, cols, where)
+
+    return db
+
+# Copy a locally built database file into the container (workers can bind-mount it instead)
+def copy_db_to_container(container_name, local_path, db_path=TEMP_DB_PATH):
     result = subprocess.run([
-        "docker", "cp", f"{container_name}:{db_path}", local_path
+        "docker", "cp", local_path, f"{container_name}:{db_path}"
     ], capture_output=True)
 
     if result.returncode != 0:
-        print("Error copying DB from container:")
+        print("Error copying DB into container:")
         print(result.stderr.decode())
     else:
-        print(f"Database copied to {local_path}")
-
-    # return db
-    return db.to_json()
+        print(f"Database copied to {container_name}:{db_path}")
 
 # Deletes all .gcda files before running
 def clear_coverage(container_name, sqlite_dir):
@@ -74,14 +149,37 @@ def clear_coverage(container_name, sqlite_dir):
         "find", sqlite_dir, "-name", "*.gcda", "-delete"
     ])
 
-# Run SQLite binary & generate .gcda files
-def run_query(container_name, sqlite_dir, sqlite_binary, query, db_path=TEMP_DB_PATH):
-    result = subprocess.run([
+# Run SQLite binary & generate .gcda files, killing it after `timeout` seconds
+def run_query(container_name, sqlite_dir, sqlite_binary, query, db_path=TEMP_DB_PATH, timeout=None):
+    try:
+        result = subprocess.run(
+            docker_query_command(container_name, sqlite_dir, sqlite_binary, db_path, timeout),
+            input=query.encode(), capture_output=True, timeout=timeout and timeout + TIMEOUT_GRACE
+        )
+    except subprocess.TimeoutExpired as e:
+        return (e.stdout or b"").strip(), TIMEOUT_MARKER.encode()
+
+    return result.stdout.strip(), timeout_stderr(result.returncode, result.stderr, timeout)
+
+# `docker exec` command running one query; the in-container `timeout` kills sqlite3 itself
+def docker_query_command(container_name, sqlite_dir, sqlite_binary, db_path, timeout=None):
+    limit = f"timeout -s KILL {timeout} " if timeout else ""
+    return [
         "docker", "exec", "-i", container_name,
-        "sh", "-c", f"cd {sqlite_dir} && ./{sqlite_binary} {db_path}"
-    ], input=query.encode(), capture_output=True)
+        "sh", "-c", f"cd {sqlite_dir} && {limit}./{sqlite_binary} {db_path}"
+    ]
 
-    return result.stdout.strip(), result.stderr.strip()
+# Mark stderr of a run stopped by `timeout` (exit 124, or 137 after SIGKILL) or by the client
+def timeout_stderr(returncode, stderr, timeout):
+    stderr = stderr.strip()
+    if timeout and returncode in (None, 124, 137):
+        stderr += f"\n{TIMEOUT_MARKER}".encode()
+    return stderr.strip()
+
+# Prefix a script so the shell interrupts any statement after `limit` progress callbacks
+# of `interval` VM instructions each (needs a shell built with the progress callback)
+def with_progress_limit(query, limit, interval=1000):
+    return f".progress {interval} --limit {limit} --reset --quiet\n{query}"
 
 # Run the coverage results
 def collect_coverage(container_name):
@@ -90,43 +188,243 @@ def collect_coverage(container_name):
         "sh", "-c", "gcov sqlite/sqlite3-sqlite3.gcda"
     ], check=True, capture_output=True, text=True)
 
-    match = re.search(r"Lines executed:([\d.]+)%", result.stdout)
-    if match:
-        percent = float(match.group(1))
-    else:
+    return parse_coverage(result.stdout)
+
+# Line coverage percentage from gcov's summary
+def parse_coverage(gcov_output):
+    match = re.search(r"Lines executed:([\d.]+)%", gcov_output)
+    if not match:
         print("Error: Could not record coverage.")
-    return percent
-
-# Copy the query to the container and then back to the local machine
-def export_query_to_local(sql_query, container_name, i, type, local_dir = "bugs", container_tmp_dir = "/tmp"):
-    filename = f"bug{i}.sql" if type == 'logical' else f"crash{i}.sql"
-    local_path = f"{local_dir}/{filename}"
-    container_path = f"{container_tmp_dir}/{filename}"
-
-    # Create a temporary file locally
-    with tempfile.NamedTemporaryFile("w", delete=False) as tmp:
-        tmp.write(sql_query)
-        tmp.flush()
-        tmp_path = tmp.name
-
-    # Copy it to the container
-    result_cp_in = subprocess.run([
-        "docker", "cp", tmp_path, f"{container_name}:{container_path}"
-    ], capture_output=True)
+        return 0.0
+    return float(match.group(1))
 
-    if result_cp_in.returncode != 0:
-        print("Error copying query into container:")
-        print(result_cp_in.stderr.decode())
-        return
+# Lines of `gcov --stdout`: "    12*:  345:<source>" when executed, "#####" or "=====" when not, "-" without code
+GCOV_EXECUTED = re.compile(rb"^ *\d+\*?: *(\d+):", re.M)
+GCOV_SOURCE = re.compile(rb"^ *-: *0:Source:(.*)$", re.M)
 
-    # 3. Copy from container to the desired local directory
-    result_cp_out = subprocess.run([
-        "docker", "cp", f"{container_name}:{container_path}", local_path
-    ], capture_output=True)
+# Line coverage percentage and executed lines of each source file ({file: [line, ...]}) from `gcov --stdout`
+def parse_line_coverage(gcov_output):
+    marks = list(GCOV_SOURCE.finditer(gcov_output))
+    if not marks:
+        print("Error: Could not record coverage.")
+        return 0.0, {}
+    sources = {}
+    executed = unexecuted = 0
+    for mark, end in zip(marks, [m.start() for m in marks[1:]] + [len(gcov_output)]):
+        chunk = gcov_output[mark.end():end]
+        lines = [int(n) for n in GCOV_EXECUTED.findall(chunk)]
+        sources[mark.group(1).decode(errors="replace").strip()] = lines
+        executed += len(lines)
+        unexecuted += chunk.count(b"#####:") + chunk.count(b"=====:")
+    total = executed + unexecuted
+    return round(100 * executed / total, 2) if total else 0.0, sources
+
+# Run a command without blocking the event loop, feeding `data` on stdin.
+# After `timeout` seconds the command is killed and the return code is None.
+async def run_async(args, data=None, cwd=None, timeout=None):
+    proc = await asyncio.create_subprocess_exec(
+        *args, cwd=cwd,
+        stdin=asyncio.subprocess.PIPE if data is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(data), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return None, b"", b""
+    return proc.returncode, stdout, stderr
+
+# Like run_async, but stdout is fed to `digest` (see digest.OutputDigest) as it is read instead of kept
+async def run_async_digest(args, data, digest, cwd=None, timeout=None, chunk_size=1 << 16):
+    proc = await asyncio.create_subprocess_exec(
+        *args, cwd=cwd,
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+
+    async def feed():
+        try:
+            proc.stdin.write(data)
+            await proc.stdin.drain()
+            proc.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # The binary exited (or crashed) before reading the whole script
+            pass
+
+    async def consume():
+        while True:
+            chunk = await proc.stdout.read(chunk_size)
+            if not chunk:
+                return
+            digest.feed(chunk)
+
+    try:
+        _, _, stderr = await asyncio.wait_for(asyncio.gather(feed(), consume(), proc.stderr.read()), timeout)
+        await proc.wait()
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return None, b""
+    digest.finish()
+    return proc.returncode, stderr
+
+class DockerBackend:
+    """Runs the sqlite3 binaries and gcov inside a container through `docker exec`/`docker cp`."""
+
+    def __init__(self, container_name="sqlite3"):
+        self.container_name = container_name
+
+    def install_db(self, local_path, db_path):
+        copy_db_to_container(self.container_name, local_path, db_path)
+        return db_path
+
+    def fetch_db(self, db_path, local_path):
+        result = subprocess.run([
+            "docker", "cp", f"{self.container_name}:{db_path}", local_path
+        ], capture_output=True)
+
+        if result.returncode != 0:
+            print("Error copying DB from container:")
+            print(result.stderr.decode())
+        else:
+            print(f"Database copied to {local_path}")
+
+    def remove_db(self, db_path):
+        subprocess.run([
+            "docker", "exec", self.container_name,
+            "sh", "-c", f"if [ -f {db_path} ]; then rm {db_path}; fi"
+        ], capture_output=True)
+
+    def clear_coverage(self, sqlite_dir):
+        clear_coverage(self.container_name, sqlite_dir)
+
+    def run_query(self, sqlite_dir, sqlite_binary, query, db_path=TEMP_DB_PATH, timeout=None):
+        return run_query(self.container_name, sqlite_dir, sqlite_binary, query, db_path=db_path, timeout=timeout)
+
+    def collect_coverage(self, sqlite_dir):
+        return collect_coverage(self.container_name)
+
+    async def run_query_async(self, sqlite_dir, sqlite_binary, query, db_path=TEMP_DB_PATH, timeout=None):
+        returncode, stdout, stderr = await run_async(
+            docker_query_command(self.container_name, sqlite_dir, sqlite_binary, db_path, timeout),
+            query.encode(), timeout=timeout and timeout + TIMEOUT_GRACE
+        )
+        return stdout.strip(), timeout_stderr(returncode, stderr, timeout)
+
+    async def digest_query_async(self, sqlite_dir, sqlite_binary, query, digest, db_path=TEMP_DB_PATH, timeout=None):
+        returncode, stderr = await run_async_digest(
+            docker_query_command(self.container_name, sqlite_dir, sqlite_binary, db_path, timeout),
+            query.encode(), digest, timeout=timeout and timeout + TIMEOUT_GRACE
+        )
+        return digest, timeout_stderr(returncode, stderr, timeout)
+
+    async def collect_coverage_async(self, sqlite_dir):
+        returncode, stdout, stderr = await run_async([
+            "docker", "exec", self.container_name,
+            "sh", "-c", "gcov sqlite/sqlite3-sqlite3.gcda"
+        ])
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, "gcov", stdout, stderr)
+        return parse_coverage(stdout.decode())
+
+    async def collect_line_coverage_async(self, sqlite_dir):
+        returncode, stdout, stderr = await run_async([
+            "docker", "exec", self.container_name,
+            "sh", "-c", "gcov --stdout sqlite/sqlite3-sqlite3.gcda"
+        ])
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, "gcov", stdout, stderr)
+        return parse_line_coverage(stdout)
+
+
+class LocalBackend:
+    """
+    Runs the instrumented and reference sqlite3 binaries directly on this machine through
+    subprocess pipes, on a database file in the local filesystem. Needs the binaries and
+    gcov installed locally (as in the sqlite3 image), but no Docker socket.
+    """
+
+    def install_db(self, local_path, db_path):
+        if os.path.abspath(local_path) != os.path.abspath(db_path):
+            shutil.copyfile(local_path, db_path)
+        return db_path
+
+    def fetch_db(self, db_path, local_path):
+        self.install_db(db_path, local_path)
+
+    def remove_db(self, db_path):
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+    def clear_coverage(self, sqlite_dir):
+        for root, _, files in os.walk(sqlite_dir):
+            for name in files:
+                if name.endswith(".gcda"):
+                    os.remove(os.path.join(root, name))
+
+    def run_query(self, sqlite_dir, sqlite_binary, query, db_path=TEMP_DB_PATH, timeout=None):
+        try:
+            result = subprocess.run(
+                [os.path.join(sqlite_dir, sqlite_binary), os.path.abspath(db_path)],
+                input=query.encode(), capture_output=True, cwd=sqlite_dir, timeout=timeout
+            )
+        except subprocess.TimeoutExpired as e:
+            return (e.stdout or b"").strip(), TIMEOUT_MARKER.encode()
+        return result.stdout.strip(), self._stderr(result.returncode, result.stderr)
+
+    def collect_coverage(self, sqlite_dir):
+        result = subprocess.run(
+            ["gcov", "sqlite3-sqlite3.gcda"], cwd=sqlite_dir, check=True, capture_output=True, text=True
+        )
+        return parse_coverage(result.stdout)
+
+    async def run_query_async(self, sqlite_dir, sqlite_binary, query, db_path=TEMP_DB_PATH, timeout=None):
+        returncode, stdout, stderr = await run_async(
+            [os.path.join(sqlite_dir, sqlite_binary), os.path.abspath(db_path)], query.encode(),
+            cwd=sqlite_dir, timeout=timeout
+        )
+        return stdout.strip(), self._stderr(returncode, stderr)
+
+    async def digest_query_async(self, sqlite_dir, sqlite_binary, query, digest, db_path=TEMP_DB_PATH, timeout=None):
+        returncode, stderr = await run_async_digest(
+            [os.path.join(sqlite_dir, sqlite_binary), os.path.abspath(db_path)], query.encode(), digest,
+            cwd=sqlite_dir, timeout=timeout
+        )
+        return digest, self._stderr(returncode, stderr)
+
+    async def collect_coverage_async(self, sqlite_dir):
+        returncode, stdout, stderr = await run_async(["gcov", "sqlite3-sqlite3.gcda"], cwd=sqlite_dir)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, "gcov", stdout, stderr)
+        return parse_coverage(stdout.decode())
+
+    async def collect_line_coverage_async(self, sqlite_dir):
+        returncode, stdout, stderr = await run_async(["gcov", "--stdout", "sqlite3-sqlite3.gcda"], cwd=sqlite_dir)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, "gcov", stdout, stderr)
+        return parse_line_coverage(stdout)
+
+    @staticmethod
+    def _stderr(returncode, stderr):
+        stderr = stderr.strip()
+        if returncode is None:
+            stderr += f"\n{TIMEOUT_MARKER}".encode()
+        elif returncode < 0:
+            # Report signals the way the container's shell does ("Segmentation fault")
+            stderr += f"\n{signal.strsignal(-returncode)}".encode()
+        return stderr.strip()
 
-    if result_cp_out.returncode != 0:
-        print("Error copying query to local machine:")
-        print(result_cp_out.stderr.decode())
-        return
 
-    print(f"Query exported to {local_path}")
+def make_backend(name, container_name="sqlite3", lib_path=None, sqlite_dir=None):
+    """
+    Execution backend by name: "docker" (default container setup), "local", or
+    "inprocess" (local, with the instrumented runs in a persistent worker over `lib_path`).
+    """
+    if name == "docker":
+        return DockerBackend(container_name)
+    if name == "local":
+        return LocalBackend()
+    if name == "inprocess":
+        from inprocess import InProcessBackend
+        return InProcessBackend(lib_path, sqlite_dir)
+    raise ValueError(f"Unknown backend: {name}")
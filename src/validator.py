@@ -0,0 +1,56 @@
+import sqlite3
+from collections import OrderedDict
+
+# Verdicts remembered, keyed by the mutant's SQL
+CACHE_SIZE = 4096
+# Errors that depend on the build rather than on the query: the Python sqlite3 may lack
+# functions or modules the fuzzed binary has, so such mutants are let through
+BUILD_ERRORS = ("no such function", "no such module", "unknown tokenizer")
+
+
+class SchemaValidator:
+    """
+    Compiles mutants against an empty in-memory replica of the fuzzed schema (the
+    `Database.to_json()` of setup_db, views included as tables) with Python's sqlite3.
+
+    Mutants that fail to parse or bind (unknown or ambiguous columns, misused
+    aggregates...) are rejected locally instead of costing two binary runs and a gcov
+    pass just to come back as syntax errors. Only EXPLAIN is run, so nothing executes.
+    """
+    def __init__(self, db_json, cache_size=CACHE_SIZE):
+        self.conn = sqlite3.connect(":memory:")
+        for name, columns in db_json.items():
+            definition = ", ".join(f'"{column}" {col_type}' for column, col_type in columns.items())
+            self.conn.execute(f'CREATE TABLE "{name}" ({definition})')
+        self.cache_size = cache_size
+        self.verdicts = OrderedDict()
+        self.hits = 0
+        self.rejected = 0
+
+    def error(self, sql):
+        """The prepare error of `sql` on the replica, or None if it compiles."""
+        try:
+            self.conn.execute("EXPLAIN " + sql.strip().rstrip(";"))
+        except (sqlite3.Warning, sqlite3.ProgrammingError):
+            # Several statements: leave them to the binaries
+            return None
+        except sqlite3.Error as e:
+            message = str(e)
+            return None if message.startswith(BUILD_ERRORS) else message
+        return None
+
+    def is_valid(self, sql):
+        verdict = self.verdicts.get(sql)
+        if verdict is not None:
+            self.hits += 1
+            self.verdicts.move_to_end(sql)
+        else:
+            verdict = self.verdicts[sql] = self.error(sql) is None
+            if len(self.verdicts) > self.cache_size:
+                self.verdicts.popitem(last=False)
+        if not verdict:
+            self.rejected += 1
+        return verdict
+
+    def __repr__(self):
+        return f"<SchemaValidator ({len(self.verdicts)} verdicts, hits: {self.hits}, rejected: {self.rejected})>"
@@ -0,0 +1,6 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The fuzzer modules import each other by bare name, main.py through the `src` package
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src")]
@@ -0,0 +1,23 @@
+import asyncio
+
+from src.crashes import CrashTriage
+
+
+class SegfaultBackend:
+    async def run_query_async(self, sqlite_dir, sqlite_binary, query, db_path=None, timeout=None):
+        return b"", b"Segmentation fault (core dumped)"
+
+
+def triage(crashes, sql):
+    return asyncio.run(crashes.triage(sql))
+
+
+def test_unsymbolized_crashes_are_not_deduplicated():
+    crashes = CrashTriage(SegfaultBackend(), ("/usr/bin", "sqlite3"), "test.db")
+    first, new_first, _ = triage(crashes, "SELECT 1 FROM t0 WHERE c0 > 5;")
+    second, new_second, _ = triage(crashes, "SELECT 1;")
+    assert new_first and new_second
+    assert first.index != second.index
+    assert len(crashes.buckets) == 2
+    # Only the very same query lands in a known bucket
+    assert triage(crashes, "SELECT 1;")[0] is second
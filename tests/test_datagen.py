@@ -0,0 +1,36 @@
+import shutil
+import sqlite3
+import subprocess
+
+import pytest
+
+from schema import ColumnType, ConstraintType, Database
+
+ROWS = 2000
+
+
+@pytest.mark.skipif(shutil.which("sqlite3") is None, reason="needs the sqlite3 shell")
+def test_csv_import_keeps_every_row(tmp_path):
+    table = Database().create_table()
+    table.create_column(ColumnType.INTEGER).add_constraint(ConstraintType.UNIQUE)
+    checked = table.create_column(ColumnType.REAL)
+    checked.add_constraint(ConstraintType.CHECK, f"{checked.name} IS NULL OR {checked.name} >= 0")
+    table.create_column(ColumnType.TEXT).add_constraint(ConstraintType.UNIQUE)
+    table.create_column(ColumnType.BOOLEAN)
+    table.create_rows(ROWS, seed=0)
+
+    csv_path = tmp_path / f"{table.name}.csv"
+    csv_path.write_text(table.to_csv())
+    db_path = tmp_path / "test.db"
+    script = "\n".join([table.create_table_sql()] + table.import_sql(csv_path)) + "\n"
+    result = subprocess.run(["sqlite3", str(db_path)], input=script.encode(), capture_output=True)
+    assert result.stderr == b""
+
+    expected_nulls = [int(nulls.sum()) for _, nulls in table.data]
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute(f"SELECT COUNT(*) FROM {table.name}").fetchone()[0] == ROWS
+        nulls = [conn.execute(f"SELECT COUNT(*) FROM {table.name} WHERE {col.name} IS NULL").fetchone()[0]
+                 for col in table.columns]
+        tables = [name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    assert nulls == expected_nulls
+    assert tables == [table.name]
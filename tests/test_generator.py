@@ -0,0 +1,27 @@
+import random
+
+import pytest
+
+from src.generator import Generator
+from scripts import create_fixed_db
+
+
+@pytest.fixture(scope="module")
+def gen():
+    return Generator(create_fixed_db(random.Random(0)).to_json(), rng=random.Random(0))
+
+
+@pytest.mark.parametrize("projection", [
+    "t4.c14, TOTAL(t4.c14)",
+    "total(t4.c14)",
+    "t4.c14, GROUP_CONCAT(t4.c14)",
+    "GROUP_CONCAT(t4.c14, ',')",
+    "JSON_GROUP_ARRAY(t4.c14)",
+])
+def test_aggregate_projections_yield_no_metamorphic_cases(gen, projection):
+    assert gen.metamorphic_queries(f"SELECT {projection} FROM t4 WHERE t4.c14 > 1") == []
+
+
+def test_plain_select_yields_metamorphic_cases(gen):
+    cases = gen.metamorphic_queries("SELECT t4.c14, ABS(t4.c14) FROM t4 WHERE t4.c14 > 1")
+    assert [kind for kind, _ in cases] == ["tlp", "norec"]
@@ -0,0 +1,49 @@
+import asyncio
+import itertools
+import random
+from collections import deque
+
+import pytest
+
+from src import main
+from src.coverage_map import CoverageMap
+from src.generator import Generator
+from src.grammar import GrammarGenerator
+from src.metrics import Metrics
+from src.queue_entry import QueueEntry
+from src.replay import ReplayLog
+from src.scheduler import OperatorScheduler
+from scripts import create_fixed_db
+
+
+class RejectAll:
+    def __init__(self):
+        self.calls = 0
+
+    def is_valid(self, sql):
+        self.calls += 1
+        return False
+
+
+def test_rejected_rounds_keep_the_parent_queued(monkeypatch, tmp_path):
+    async def seed(entry_ids):
+        main.queue.append(QueueEntry(sql=main.seed_initial_queries()[0], entry_id=next(entry_ids)))
+
+    monkeypatch.setattr(main, "queue", deque())
+    monkeypatch.setattr(main, "initialize_queue", seed)
+    monkeypatch.setattr(main, "coverage_map", CoverageMap())
+    monkeypatch.setattr(main, "metrics", Metrics())
+
+    db = create_fixed_db(random.Random(0)).to_json()
+    replay_log = ReplayLog(str(tmp_path / "campaign.log"), 0, None, main.MUTATION_ATTEMPTS, main.seed_initial_queries())
+    validator = RejectAll()
+    campaign = main.fuzz(Generator(db, rng=random.Random()), GrammarGenerator(db, rng=random.Random()),
+                         random.Random(0), itertools.count(), replay_log, None, None,
+                         OperatorScheduler(rng=random.Random(0)), validator)
+    # Nothing ever runs, so the campaign only ends if the queue empties
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(campaign, 1.0))
+    replay_log.close()
+
+    assert len(main.queue) == 1
+    assert validator.calls > main.MAX_MUTATIONS * main.MUTATION_ATTEMPTS